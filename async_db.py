@@ -0,0 +1,132 @@
+import asyncio
+import functools
+import os
+
+from db_pool import DB_CONFIG, POOL_SIZE, POOL_RECYCLE, get_pool
+
+# Non-blocking DB access for the async request path.
+# Uses an aiomysql pool when the driver is installed; otherwise queries run on
+# the shared sync pool in a worker thread so the event loop is never blocked.
+
+try:
+    import aiomysql
+except ImportError:
+    aiomysql = None
+
+# Rows fetched per round trip when streaming results
+STREAM_BATCH_SIZE = int(os.getenv('STREAM_BATCH_SIZE', 500))
+
+_pool = None
+_pool_lock = None
+
+
+async def get_async_pool():
+    global _pool, _pool_lock
+    if _pool_lock is None:
+        _pool_lock = asyncio.Lock()
+    if _pool is None:
+        async with _pool_lock:
+            if _pool is None:
+                _pool = await aiomysql.create_pool(
+                    host=DB_CONFIG['host'],
+                    port=DB_CONFIG['port'],
+                    user=DB_CONFIG['user'],
+                    password=DB_CONFIG['password'],
+                    db=DB_CONFIG['database'],
+                    minsize=1,
+                    maxsize=POOL_SIZE,
+                    pool_recycle=POOL_RECYCLE,
+                    # Each statement sees fresh data, like the sync pool's rollback-on-release
+                    autocommit=True
+                )
+    return _pool
+
+
+async def close_async_pool():
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        await _pool.wait_closed()
+        _pool = None
+
+
+def _fetch_all_sync(sql, params, dictionary):
+    conn = get_pool(DB_CONFIG).get_connection()
+    try:
+        cursor = conn.cursor(dictionary=dictionary)
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+    finally:
+        conn.close()
+
+
+async def fetch_all(sql, params=(), dictionary=True):
+    if aiomysql is None:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(_fetch_all_sync, sql, params, dictionary))
+
+    pool = await get_async_pool()
+    async with pool.acquire() as conn:
+        async with conn.cursor(aiomysql.DictCursor if dictionary else aiomysql.Cursor) as cursor:
+            await cursor.execute(sql, params)
+            return list(await cursor.fetchall())
+
+
+def _open_stream_sync(sql, params):
+    conn = get_pool(DB_CONFIG).get_connection()
+    try:
+        # Unbuffered: rows stay on the server until fetched
+        cursor = conn.cursor(dictionary=True, buffered=False)
+        cursor.execute(sql, params)
+    except Exception:
+        conn.close()
+        raise
+    return conn, cursor
+
+
+async def iter_rows(sql, params=(), batch_size=STREAM_BATCH_SIZE):
+    # Async generator over result rows using a server-side (unbuffered) cursor,
+    # so at most batch_size rows are held in memory at a time. Stopping early
+    # discards the rest of the result when the connection is released.
+    if aiomysql is None:
+        loop = asyncio.get_running_loop()
+        conn, cursor = await loop.run_in_executor(None, _open_stream_sync, sql, params)
+        try:
+            while True:
+                batch = await loop.run_in_executor(None, cursor.fetchmany, batch_size)
+                if not batch:
+                    break
+                for row in batch:
+                    yield row
+        finally:
+            await loop.run_in_executor(None, conn.close)
+        return
+
+    pool = await get_async_pool()
+    async with pool.acquire() as conn:
+        async with conn.cursor(aiomysql.SSDictCursor) as cursor:
+            await cursor.execute(sql, params)
+            while True:
+                batch = await cursor.fetchmany(batch_size)
+                if not batch:
+                    break
+                for row in batch:
+                    yield row
+
+
+async def fetch_one(sql, params=(), dictionary=True):
+    rows = await fetch_all(sql, params, dictionary)
+    return rows[0] if rows else None
+
+
+def stats():
+    if aiomysql is None:
+        return {'driver': 'threadpool'}
+    if _pool is None:
+        return {'driver': 'aiomysql', 'size': 0}
+    return {
+        'driver': 'aiomysql',
+        'size': _pool.size,
+        'free': _pool.freesize,
+        'max_size': _pool.maxsize
+    }
@@ -0,0 +1,131 @@
+import asyncio
+import bisect
+import os
+import threading
+import time
+
+# Micro-batching for concurrent single-item requests.
+#
+# Callers submit one item and await its result. Items are collected for up to
+# BATCH_WINDOW_MS after the first one arrives (or until MAX_BATCH are pending)
+# and handed to the handler as one list, e.g. one DB fetch + one ONNX run for
+# every /predict arriving within a few milliseconds. Results are fanned back
+# to the waiting callers in order; a failing batch fails each of its callers.
+# Batches run concurrently: the next one is collected while the last one runs.
+
+BATCHING_ENABLED = os.getenv('PREDICT_BATCHING', '1') == '1'
+BATCH_WINDOW_MS = float(os.getenv('PREDICT_BATCH_WINDOW_MS', 2))
+MAX_BATCH = int(os.getenv('PREDICT_MAX_BATCH', 64))
+
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+WAIT_MS_BUCKETS = [0.5, 1, 2, 5, 10, 25, 50, 100, 250, 1000]
+
+
+class Histogram:
+    # Fixed buckets: counts[i] = observations <= bounds[i] (last slot: above every bound)
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.bounds, value)] += 1
+            self.count += 1
+            self.total += value
+            self.max = max(self.max, value)
+
+    def stats(self):
+        with self._lock:
+            buckets = {f"le_{b}": c for b, c in zip(self.bounds, self.counts)}
+            buckets['inf'] = self.counts[-1]
+            return {
+                'count': self.count,
+                'mean': round(self.total / self.count, 3) if self.count else 0.0,
+                'max': round(self.max, 3),
+                'buckets': buckets
+            }
+
+
+class MicroBatcher:
+    def __init__(self, handler, window_ms=BATCH_WINDOW_MS, max_batch=MAX_BATCH):
+        """
+        handler: async callable(list of items) -> list of results in the same order.
+        """
+        self.handler = handler
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._pending = []
+        self._timer = None
+        # Running batches: the loop only keeps weak references to tasks
+        self._tasks = set()
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_wait_ms = Histogram(WAIT_MS_BUCKETS)
+        self.batches = 0
+        self.requests = 0
+        self.errors = 0
+
+    async def submit(self, item):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future, time.perf_counter()))
+        self.requests += 1
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        # Runs on the event loop thread (submit / call_later), so no locking is needed
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._pending:
+            batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        now = time.perf_counter()
+        self.batches += 1
+        self.batch_sizes.observe(len(batch))
+        for _, _, enqueued in batch:
+            self.queue_wait_ms.observe((now - enqueued) * 1000)
+
+        try:
+            results = await self.handler([item for item, _, _ in batch])
+        except Exception as e:
+            self.errors += 1
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        results = list(results)
+        if len(results) != len(batch):
+            self.errors += 1
+        for n, (_, future, _) in enumerate(batch):
+            # A caller may have gone away (request cancelled) while the batch ran
+            if future.done():
+                continue
+            if n < len(results):
+                future.set_result(results[n])
+            else:
+                future.set_exception(RuntimeError(f"Batch handler returned {len(results)} results for {len(batch)} items"))
+
+    def stats(self):
+        return {
+            'window_ms': self.window * 1000,
+            'max_batch': self.max_batch,
+            'requests': self.requests,
+            'batches': self.batches,
+            'errors': self.errors,
+            'pending': len(self._pending),
+            'running': len(self._tasks),
+            'batch_size': self.batch_sizes.stats(),
+            'queue_wait_ms': self.queue_wait_ms.stats()
+        }
@@ -0,0 +1,155 @@
+import os
+import tempfile
+import time
+
+import mysql.connector
+
+from db_pool import DB_CONFIG
+
+# Bulk-load mode for large imports: rows are streamed into a temporary
+# tab-separated file (MySQL's default LOAD DATA format) and loaded with
+# LOAD DATA LOCAL INFILE, one file / transaction per chunk. Secondary indexes
+# can be dropped for the load and rebuilt in a single ALTER afterwards.
+#
+# Needs local_infile=ON on the server; the client side is enabled by connect().
+
+# Rows per temp file / LOAD DATA statement (bounds temp disk usage)
+CHUNK_ROWS = int(os.getenv('BULK_CHUNK_ROWS', 1000000))
+
+NULL = '\\N'
+
+
+def connect(config=None):
+    return mysql.connector.connect(**(config or DB_CONFIG), allow_local_infile=True)
+
+
+def _field(value):
+    if value is None or (isinstance(value, float) and value != value):  # NaN -> NULL
+        return NULL
+    text = str(value)
+    if '\\' in text or '\t' in text or '\n' in text or '\r' in text:
+        text = text.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+    return text
+
+
+def write_chunk(f, rows, limit):
+    # Write up to `limit` rows from the iterator; returns the number written
+    written = 0
+    for row in rows:
+        f.write('\t'.join(_field(v) for v in row))
+        f.write('\n')
+        written += 1
+        if written >= limit:
+            break
+    return written
+
+
+def load_file(conn, path, columns, table='production_data'):
+    cursor = conn.cursor()
+    cursor.execute(
+        f"LOAD DATA LOCAL INFILE %s INTO TABLE {table} CHARACTER SET utf8mb4 "
+        f"FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n' "
+        f"({', '.join(columns)})",
+        (path,)
+    )
+    return cursor.rowcount
+
+
+def secondary_indexes(conn, table='production_data'):
+    # {name: [columns in order]} for non-unique secondary indexes
+    # (unique keys stay in place: they enforce constraints during the load)
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(f"SHOW INDEX FROM {table}")
+    indexes = {}
+    for row in cursor.fetchall():
+        if row['Key_name'] == 'PRIMARY' or not row['Non_unique']:
+            continue
+        col = f"`{row['Column_name']}`"
+        if row['Sub_part']:
+            col += f"({row['Sub_part']})"
+        indexes.setdefault(row['Key_name'], []).append((row['Seq_in_index'], col))
+    return {name: [col for _, col in sorted(cols)] for name, cols in indexes.items()}
+
+
+def drop_indexes(conn, indexes, table='production_data'):
+    if not indexes:
+        return
+    cursor = conn.cursor()
+    cursor.execute(f"ALTER TABLE {table} " + ', '.join(f"DROP INDEX `{name}`" for name in indexes))
+
+
+def add_indexes(conn, indexes, table='production_data'):
+    # All indexes in one ALTER: a single pass over the table
+    if not indexes:
+        return
+    cursor = conn.cursor()
+    cursor.execute(
+        f"ALTER TABLE {table} " +
+        ', '.join(f"ADD INDEX `{name}` ({', '.join(cols)})" for name, cols in indexes.items())
+    )
+
+
+def rebuild_derived(conn):
+    # Per-row ingest hooks are skipped in bulk mode; rebuild derived tables once
+    import rollup
+    import style_progress
+    style_progress.rebuild(conn)
+    rollup.rebuild(conn)
+
+
+def bulk_load(conn, rows, columns, table='production_data', defer_indexes=False,
+              chunk_rows=CHUNK_ROWS, rebuild=True):
+    """
+    Loads an iterable of tuples (in `columns` order) with LOAD DATA LOCAL INFILE.
+    Returns {'rows', 'seconds', 'rows_per_sec', ...} timings.
+    """
+    start = time.time()
+    rows = iter(rows)
+    stats = {'rows': 0, 'write_s': 0.0, 'load_s': 0.0, 'index_s': 0.0, 'derived_s': 0.0}
+
+    dropped = {}
+    if defer_indexes:
+        dropped = secondary_indexes(conn, table)
+        print(f"Dropping {len(dropped)} secondary indexes for the load: {', '.join(dropped) or '-'}")
+        drop_indexes(conn, dropped, table)
+
+    try:
+        while True:
+            t = time.time()
+            with tempfile.NamedTemporaryFile('w', suffix='.tsv', delete=False, encoding='utf-8', newline='\n') as f:
+                path = f.name
+                written = write_chunk(f, rows, chunk_rows)
+            stats['write_s'] += time.time() - t
+            try:
+                if not written:
+                    break
+                t = time.time()
+                load_file(conn, path, columns, table)
+                conn.commit()
+                stats['load_s'] += time.time() - t
+            finally:
+                os.remove(path)
+
+            stats['rows'] += written
+            elapsed = time.time() - start
+            print(f"Loaded {stats['rows']} rows ({stats['rows'] / elapsed:,.0f} rows/sec)")
+    finally:
+        if dropped:
+            t = time.time()
+            print("Rebuilding secondary indexes...")
+            add_indexes(conn, dropped, table)
+            stats['index_s'] = time.time() - t
+
+    if rebuild and table == 'production_data' and stats['rows']:
+        t = time.time()
+        rebuild_derived(conn)
+        stats['derived_s'] = time.time() - t
+
+    stats['seconds'] = time.time() - start
+    stats['rows_per_sec'] = stats['rows'] / stats['seconds'] if stats['seconds'] else 0
+    print(
+        f"Bulk load: {stats['rows']} rows in {stats['seconds']:.1f}s "
+        f"({stats['rows_per_sec']:,.0f} rows/sec overall; write {stats['write_s']:.1f}s, "
+        f"load {stats['load_s']:.1f}s, indexes {stats['index_s']:.1f}s, derived {stats['derived_s']:.1f}s)"
+    )
+    return stats
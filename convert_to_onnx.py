@@ -1,26 +1,261 @@
+import argparse
+import copy
+import os
+import time
 
 import joblib
 import numpy as np
 from skl2onnx import convert_sklearn
 from skl2onnx.common.data_types import FloatTensorType
-import onnx
+import onnxruntime as ort
 
-# Load Model
-print("Loading model...")
-artifacts = joblib.load('model_order_completion.pkl')
-model = artifacts['model']
-print("Model loaded.")
+# Export pipeline for the order completion model:
+#   1. optional node-count reduction of the forest (fewer trees, depth cap,
+#      minimum samples per leaf) on a copy of the model - the .pkl is untouched
+#   2. conversion, then onnxruntime graph optimizations saved as a second file
+#      (basic by default: higher levels may write nodes specific to this machine)
+#   3. equivalence check against sklearn and a latency benchmark, before vs after
+# Precision: the graph takes float32 input because sklearn trees cast X to
+# float32 before comparing it with their split thresholds. (Double inputs and
+# thresholds would run in onnxruntime too, via ai.onnx.ml opset 3, but would
+# send values close to a threshold down a different branch than sklearn.)
+# skl2onnx rounds each threshold to the float32 that keeps float32 inputs on
+# the same side as in sklearn, so the check below should only see float32
+# leaf-sum rounding.
 
-# Define input type: 11 float features
-# feature_cols = ['style_encoded', 'buyer_encoded', 'order_quantity', 'cumulative_achieved', 'remaining_qty', 'daily_efficiency', 'efficiency_trend', 'fabric_variance', 'hour_output', 'rejection', 'line_no']
-initial_type = [('float_input', FloatTensorType([None, 11]))]
+MODEL_PATH = 'model_order_completion.onnx'
+OPTIMIZED_PATH = 'model_order_completion.optimized.onnx'
+BENCH_RUNS = 200
+BATCH_ROWS = 1000
+# Predictions are pieces/day; ONNX may differ from sklearn by float32 rounding only
+EQUIVALENCE_ATOL = 0.5
 
-# Convert
-print("Converting to ONNX...")
-onx = convert_sklearn(model, initial_types=initial_type)
+OPT_LEVELS = {
+    'disable': ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    'basic': ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    'extended': ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    'all': ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+}
 
-# Save
-with open("model_order_completion.onnx", "wb") as f:
-    f.write(onx.SerializeToString())
+# sklearn.tree._tree constants
+TREE_LEAF = -1
+TREE_UNDEFINED = -2
 
-print("ONNX model saved to 'model_order_completion.onnx'")
+
+def trim_tree(estimator, max_depth=None, min_leaf_samples=1):
+    # Turn nodes below max_depth, or whose split leaves a child under
+    # min_leaf_samples, into leaves (the node value is the mean of its samples).
+    # Unreachable nodes are dropped, so the exported graph actually shrinks.
+    from sklearn.tree._tree import Tree
+    tree = estimator.tree_
+    state = tree.__getstate__()
+    nodes, values = state['nodes'], state['values']
+
+    order, new_id, split = [], {}, []
+    stack = [(0, 0)]
+    while stack:
+        node, depth = stack.pop()
+        new_id[node] = len(order)
+        order.append(node)
+        left, right = nodes['left_child'][node], nodes['right_child'][node]
+        keep_split = (
+            left != TREE_LEAF
+            and (max_depth is None or depth < max_depth)
+            and min(nodes['n_node_samples'][left], nodes['n_node_samples'][right]) >= min_leaf_samples
+        )
+        split.append(keep_split)
+        if keep_split:
+            stack.append((right, depth + 1))
+            stack.append((left, depth + 1))
+
+    new_nodes = nodes[order].copy()
+    for i, node in enumerate(order):
+        if split[i]:
+            new_nodes['left_child'][i] = new_id[nodes['left_child'][node]]
+            new_nodes['right_child'][i] = new_id[nodes['right_child'][node]]
+        else:
+            new_nodes['left_child'][i] = new_nodes['right_child'][i] = TREE_LEAF
+            new_nodes['feature'][i] = new_nodes['threshold'][i] = TREE_UNDEFINED
+
+    state = dict(state, nodes=new_nodes, values=values[order].copy(), node_count=len(order))
+    if max_depth is not None:
+        state['max_depth'] = min(state['max_depth'], max_depth)
+    trimmed = Tree(tree.n_features, np.array(tree.n_classes), tree.n_outputs)
+    trimmed.__setstate__(state)
+    estimator.tree_ = trimmed
+
+
+def tree_estimators(model):
+    return list(getattr(model, 'estimators_', [model] if hasattr(model, 'tree_') else []))
+
+
+def prepare_model(model, max_trees=None, max_depth=None, min_leaf_samples=1):
+    # Trimmed copy of the model (non-tree models pass through)
+    model = copy.deepcopy(model)
+    if max_trees and hasattr(model, 'estimators_') and max_trees < len(model.estimators_):
+        # A forest's prediction is the mean over its trees; any subset is a smaller forest
+        model.estimators_ = model.estimators_[:max_trees]
+        model.n_estimators = max_trees
+    if max_depth is not None or min_leaf_samples > 1:
+        for estimator in tree_estimators(model):
+            trim_tree(estimator, max_depth, min_leaf_samples)
+    return model
+
+
+def node_count(model):
+    return sum(e.tree_.node_count for e in tree_estimators(model))
+
+
+def convert(model, n_features=11):
+    # Define input type: 11 float features
+    # feature_cols = ['style_encoded', 'buyer_encoded', 'order_quantity', 'cumulative_achieved', 'remaining_qty', 'daily_efficiency', 'efficiency_trend', 'fabric_variance', 'hour_output', 'rejection', 'line_no']
+    initial_type = [('float_input', FloatTensorType([None, n_features]))]
+    return convert_sklearn(model, initial_types=initial_type).SerializeToString()
+
+
+def make_session(model, opt_level='basic', optimized_path=None):
+    opts = ort.SessionOptions()
+    opts.graph_optimization_level = OPT_LEVELS[opt_level]
+    if optimized_path:
+        # onnxruntime writes the graph after its optimizations to this file
+        opts.optimized_model_filepath = optimized_path
+    return ort.InferenceSession(model, opts, providers=['CPUExecutionProvider'])
+
+
+def sample_inputs(model, artifacts, rows=BATCH_ROWS, seed=42):
+    """
+    Benchmark / equivalence inputs: cached training rows from the feature store
+    (encoded with the model's own encoders, styles/buyers it never saw left out)
+    when available, else values drawn between each feature's split thresholds.
+    """
+    try:
+        from feature_store import FeatureStore
+        from train_model import FEATURE_COLUMNS
+        from feature_engine import NUMERIC_FEATURES
+        data = FeatureStore().load()
+    except Exception:
+        data = None
+
+    rng = np.random.default_rng(seed)
+    le_style, le_buyer = artifacts.get('le_style'), artifacts.get('le_buyer')
+    known = None
+    if data is not None and len(data['id']) and le_style is not None and le_buyer is not None:
+        known = np.flatnonzero(
+            np.isin(data['style_no'], le_style.classes_) & np.isin(data['buyer_name'], le_buyer.classes_)
+        )
+    if known is not None and len(known):
+        pick = rng.choice(known, min(rows, len(known)), replace=False)
+        columns = {
+            'style_encoded': le_style.transform(data['style_no'][pick]),
+            'buyer_encoded': le_buyer.transform(data['buyer_name'][pick])
+        }
+        for i, col in enumerate(NUMERIC_FEATURES):
+            columns[col] = data['features'][pick, i]
+        return np.column_stack([columns[c] for c in FEATURE_COLUMNS]).astype(np.float32)
+
+    n_features = model.n_features_in_
+    X = np.zeros((rows, n_features), dtype=np.float32)
+    for f in range(n_features):
+        thresholds = np.concatenate([
+            e.tree_.threshold[e.tree_.feature == f] for e in tree_estimators(model)
+        ] or [np.zeros(0)])
+        low, high = (thresholds.min(), thresholds.max()) if len(thresholds) else (0.0, 1.0)
+        X[:, f] = rng.uniform(low, high, rows)
+    return X
+
+
+def benchmark(sess, X, runs=BENCH_RUNS):
+    # p50/p99 ms for one row and for the whole batch
+    input_name = sess.get_inputs()[0].name
+    output_name = sess.get_outputs()[0].name
+    stats = {}
+    for label, batch in (('single', X[:1]), ('batch', X)):
+        sess.run([output_name], {input_name: batch})  # warm-up
+        times = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            sess.run([output_name], {input_name: batch})
+            times.append((time.perf_counter() - start) * 1000)
+        stats[f'{label}_p50'], stats[f'{label}_p99'] = np.percentile(times, [50, 99])
+    return stats
+
+
+def predict(sess, X):
+    return sess.run([sess.get_outputs()[0].name], {sess.get_inputs()[0].name: X})[0].reshape(-1)
+
+
+def check_equivalence(sess, reference_model, X, label):
+    # ONNX vs sklearn on the same float32 rows
+    diff = np.abs(predict(sess, X) - reference_model.predict(X))
+    over = int((diff > EQUIVALENCE_ATOL).sum())
+    print(f"{label}: max |diff| {diff.max():.4f} pcs, mean {diff.mean():.5f}, {over}/{len(X)} rows over {EQUIVALENCE_ATOL}")
+    return over == 0
+
+
+def run(pkl_path='model_order_completion.pkl', output=MODEL_PATH, optimized_output=OPTIMIZED_PATH,
+        max_trees=None, max_depth=None, min_leaf_samples=1, opt_level='basic',
+        bench=True):
+    # Load Model
+    print("Loading model...")
+    artifacts = joblib.load(pkl_path)
+    model = artifacts['model']
+    print("Model loaded.")
+
+    trimmed = bool(max_trees) or max_depth is not None or min_leaf_samples > 1
+    prepared = prepare_model(model, max_trees, max_depth, min_leaf_samples) if trimmed else model
+    if tree_estimators(model):
+        print(f"Trees: {len(tree_estimators(model))} -> {len(tree_estimators(prepared))}, "
+              f"nodes: {node_count(model):,} -> {node_count(prepared):,}")
+
+    # Convert
+    print("Converting to ONNX...")
+    onx = convert(prepared, model.n_features_in_)
+    with open(output, "wb") as f:
+        f.write(onx)
+    print(f"ONNX model saved to '{output}' ({len(onx) / 1024:,.0f} KB)")
+
+    # Only creating the session matters: it makes onnxruntime write optimized_model_filepath
+    make_session(onx, opt_level, optimized_path=optimized_output)
+    print(f"Optimized ({opt_level}) model saved to '{optimized_output}' ({os.path.getsize(optimized_output) / 1024:,.0f} KB)")
+    optimized = make_session(optimized_output, 'disable')
+
+    X = sample_inputs(model, artifacts)
+    ok = check_equivalence(optimized, prepared, X, "Optimized ONNX vs exported sklearn model")
+    if trimmed:
+        diff = np.abs(prepared.predict(X) - model.predict(X))
+        print(f"Trimming effect vs original model: mean |diff| {diff.mean():.2f} pcs, max {diff.max():.2f}")
+
+    if bench:
+        # Before: default conversion of the original model, no graph optimizations
+        baseline_onx = convert(model, model.n_features_in_) if trimmed else onx
+        baseline = make_session(baseline_onx, 'disable')
+        before, after = benchmark(baseline, X), benchmark(optimized, X)
+        print(f"\n{'':<10} {'size KB':>10} {'1-row p50':>10} {'1-row p99':>10} {f'{len(X)}-row p50':>12} {f'{len(X)}-row p99':>12}")
+        for label, size, s in (('before', len(baseline_onx), before), ('after', os.path.getsize(optimized_output), after)):
+            print(f"{label:<10} {size / 1024:>10,.0f} {s['single_p50']:>10.3f} {s['single_p99']:>10.3f} "
+                  f"{s['batch_p50']:>12.2f} {s['batch_p99']:>12.2f}")
+    if not ok:
+        print("WARNING: ONNX predictions differ from the sklearn model beyond float32 rounding.")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the completion model to ONNX, optimized and benchmarked.")
+    parser.add_argument('--input', default='model_order_completion.pkl')
+    parser.add_argument('--output', default=MODEL_PATH)
+    parser.add_argument('--optimized-output', default=OPTIMIZED_PATH)
+    parser.add_argument('--max-trees', type=int, default=None, help="Keep only the first N trees of a forest")
+    parser.add_argument('--max-depth', type=int, default=None, help="Cut trees to this depth")
+    parser.add_argument('--min-leaf-samples', type=int, default=1, help="Collapse splits leaving fewer training samples in a child")
+    parser.add_argument('--opt-level', choices=list(OPT_LEVELS), default='basic',
+                        help="Optimizations saved to --optimized-output (above basic may be hardware-specific)")
+    parser.add_argument('--no-bench', action='store_true', help="Skip the latency benchmark")
+    args = parser.parse_args()
+
+    ok = run(
+        args.input, args.output, args.optimized_output,
+        max_trees=args.max_trees, max_depth=args.max_depth, min_leaf_samples=args.min_leaf_samples,
+        opt_level=args.opt_level, bench=not args.no_bench
+    )
+    if not ok:
+        raise SystemExit(1)
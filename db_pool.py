@@ -0,0 +1,240 @@
+import os
+import queue
+import threading
+import time
+
+import mysql.connector
+
+# DB Config (shared by the API, PredictEngine and QueryInterpreter)
+DB_CONFIG = {
+    'host': os.getenv('DB_HOST', 'localhost'),
+    'user': os.getenv('DB_USER', 'root'),
+    'password': os.getenv('DB_PASSWORD', ''),
+    'database': os.getenv('DB_NAME', 'garment_db'),
+    'port': int(os.getenv('DB_PORT', 3306))
+}
+
+# Pool tuning (all overridable from the environment)
+POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
+POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))  # seconds to wait for a free connection
+POOL_RECYCLE = float(os.getenv('DB_POOL_RECYCLE', 1800))  # close connections older than this
+POOL_PING_AFTER = float(os.getenv('DB_POOL_PING_AFTER', 30))  # health check connections idle longer than this
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class PooledConnection:
+    """
+    Thin proxy around a mysql.connector connection.
+    close() hands the connection back to the pool instead of closing the socket,
+    so existing `conn = get_db_connection(); ...; conn.close()` code keeps working.
+    Once closed, the proxy no longer reaches the connection (another caller may own it).
+    """
+
+    def __init__(self, pool, conn, created_at):
+        self._pool = pool
+        self._conn = conn
+        self.created_at = created_at
+        self.last_used = time.time()
+
+    def close(self):
+        if self._pool is not None:
+            # Detach before releasing: once idle the connection may be handed out again
+            pool, self._pool = self._pool, None
+            conn, self._conn = self._conn, None
+            pool.release(conn, self.created_at)
+
+    def __getattr__(self, name):
+        conn = self.__dict__.get('_conn')
+        if conn is None:
+            raise mysql.connector.errors.OperationalError("Connection was returned to the pool")
+        return getattr(conn, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ConnectionPool:
+    def __init__(self, config=None, size=POOL_SIZE, timeout=POOL_TIMEOUT,
+                 recycle=POOL_RECYCLE, ping_after=POOL_PING_AFTER):
+        self.config = dict(config or DB_CONFIG)
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_after = ping_after
+
+        # LIFO keeps the hottest connections in use and lets idle ones age out
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        # Signalled whenever a connection goes idle or a slot frees up (discard)
+        self._available = threading.Condition(self._lock)
+        self._open = 0
+
+        # Metrics
+        self._stats = {
+            'checkouts': 0,
+            'created': 0,
+            'recycled': 0,
+            'failed_health_checks': 0,
+            'timeouts': 0,
+            'wait_count': 0,
+            'wait_time_total_ms': 0.0,
+            'wait_time_max_ms': 0.0
+        }
+
+    def _connect(self):
+        conn = mysql.connector.connect(**self.config)
+        with self._lock:
+            self._stats['created'] += 1
+        return conn
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._open -= 1
+            self._available.notify()
+
+    def _is_healthy(self, pooled):
+        now = time.time()
+        if self.recycle and now - pooled.created_at > self.recycle:
+            with self._lock:
+                self._stats['recycled'] += 1
+            return False
+        if self.ping_after and now - pooled.last_used > self.ping_after:
+            try:
+                pooled._conn.ping(reconnect=False)
+            except Exception:
+                with self._lock:
+                    self._stats['failed_health_checks'] += 1
+                return False
+        return True
+
+    def get_connection(self):
+        start = time.perf_counter()
+        waited = False
+        while True:
+            # 1. Reuse an idle connection
+            try:
+                conn, created_at, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                conn = None
+
+            if conn is not None:
+                pooled = PooledConnection(self, conn, created_at)
+                pooled.last_used = last_used
+                if self._is_healthy(pooled):
+                    break
+                self._discard(conn)
+                continue
+
+            # 2. Open a new one if we are under the size limit
+            with self._lock:
+                can_open = self._open < self.size
+                if can_open:
+                    self._open += 1
+            if can_open:
+                try:
+                    pooled = PooledConnection(self, self._connect(), time.time())
+                except Exception:
+                    with self._lock:
+                        self._open -= 1
+                        self._available.notify()
+                    raise
+                break
+
+            # 3. Pool exhausted -> wait for a release or a freed slot, then retry both
+            waited = True
+            remaining = self.timeout - (time.perf_counter() - start)
+            if remaining <= 0:
+                with self._lock:
+                    self._stats['timeouts'] += 1
+                raise PoolTimeout(f"No DB connection available after {self.timeout}s (pool size {self.size})")
+            with self._available:
+                if self._idle.empty() and self._open >= self.size:
+                    self._available.wait(remaining)
+
+        wait_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self._stats['checkouts'] += 1
+            if waited:
+                self._stats['wait_count'] += 1
+                self._stats['wait_time_total_ms'] += wait_ms
+                self._stats['wait_time_max_ms'] = max(self._stats['wait_time_max_ms'], wait_ms)
+        pooled.last_used = time.time()
+        return pooled
+
+    def release(self, conn, created_at):
+        try:
+            # End any open transaction so the next user gets a fresh snapshot
+            # and no unread results are left on the wire
+            if conn.unread_result:
+                conn.consume_results()
+            conn.rollback()
+        except Exception:
+            self._discard(conn)
+            return
+        self._idle.put((conn, created_at, time.time()))
+        with self._available:
+            self._available.notify()
+
+    def close_all(self):
+        while True:
+            try:
+                conn, _, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = self.size
+            stats['open'] = self._open
+        stats['idle'] = self._idle.qsize()
+        stats['in_use'] = stats['open'] - stats['idle']
+        stats['wait_time_avg_ms'] = round(stats['wait_time_total_ms'] / stats['wait_count'], 2) if stats['wait_count'] else 0.0
+        stats['wait_time_total_ms'] = round(stats['wait_time_total_ms'], 2)
+        stats['wait_time_max_ms'] = round(stats['wait_time_max_ms'], 2)
+        return stats
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(config=None):
+    # Process-wide pool, created on first use
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(config)
+    return _pool
+
+
+def get_connection():
+    return get_pool().get_connection()
+
+
+# Cheap change marker for production_data: both are single index lookups
+# (primary key / idx_date_measures). Changes whenever rows are ingested.
+DATA_VERSION_QUERY = "SELECT MAX(id), MAX(production_date) FROM production_data"
+
+
+def data_version_from_row(row):
+    max_id, max_date = row
+    return (max_id, str(max_date) if max_date else None)
+
+
+def fetch_data_version(conn):
+    cursor = conn.cursor()
+    cursor.execute(DATA_VERSION_QUERY)
+    return data_version_from_row(cursor.fetchone())
@@ -0,0 +1,91 @@
+import re
+
+# Token-trie matcher for the entities QueryInterpreter looks for in a query
+# (styles, buyers, fabrics, lines). Entity phrases are tokenized the same way
+# as queries, so matching is whole-token and case-insensitive, and a query is
+# scanned in O(tokens x longest phrase) no matter how many entities are loaded.
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+|[^\sa-z0-9]")
+
+
+def tokenize(text):
+    # Alphanumeric runs and single punctuation marks ("H&M" -> h, &, m)
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+
+class _Node:
+    __slots__ = ('children', 'entities')
+
+    def __init__(self):
+        self.children = {}
+        self.entities = None  # {kind: value} for phrases ending here
+
+    def copy(self):
+        node = _Node()
+        node.children = {token: child.copy() for token, child in self.children.items()}
+        node.entities = dict(self.entities) if self.entities else None
+        return node
+
+
+class EntityMatcher:
+    def __init__(self):
+        self.root = _Node()
+        self.counts = {}
+
+    def add(self, kind, value, phrase=None):
+        # Register `value` for `kind`, matched by `phrase` (defaults to the value).
+        # Safe to call at any time; new entities are visible to the next find()
+        tokens = tokenize(phrase if phrase is not None else value)
+        if not tokens:
+            return False
+        node = self.root
+        for token in tokens:
+            child = node.children.get(token)
+            if child is None:
+                child = node.children[token] = _Node()
+            node = child
+        if node.entities is None:
+            node.entities = {}
+        if kind in node.entities:
+            return False
+        node.entities[kind] = value
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+        return True
+
+    def add_many(self, kind, values, phrase_format=None):
+        added = 0
+        for value in values:
+            phrase = phrase_format.format(value) if phrase_format else None
+            if self.add(kind, value, phrase):
+                added += 1
+        return added
+
+    def find(self, text, kinds=None):
+        # Leftmost (then longest) match per kind -> {kind: value}
+        tokens = tokenize(text)
+        wanted = set(kinds) if kinds else set(self.counts)
+        found = {}
+        for start in range(len(tokens)):
+            if len(found) == len(wanted):
+                break
+            node = self.root
+            longest = {}
+            for token in tokens[start:]:
+                node = node.children.get(token)
+                if node is None:
+                    break
+                if node.entities:
+                    for kind, value in node.entities.items():
+                        if kind in wanted and kind not in found:
+                            longest[kind] = value
+            found.update(longest)
+        return found
+
+    def copy(self):
+        matcher = EntityMatcher()
+        matcher.root = self.root.copy()
+        matcher.counts = dict(self.counts)
+        return matcher
+
+    def __len__(self):
+        return sum(self.counts.values())
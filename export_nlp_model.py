@@ -0,0 +1,80 @@
+import sys
+
+import joblib
+import numpy as np
+
+from intent_scorer import IntentScorer
+from train_nlp import generate_dataset
+
+# Export the sklearn intent pipeline (nlp_model.pkl) to plain arrays
+# (nlp_model.npz) for IntentScorer, then check both give the same intents.
+
+CHECK_QUERIES = [
+    "Show efficiency for H&M last week",
+    "Give me rejection summary for H&M",
+    "Fabric wastage report for Single Jersey",
+    "Predict completion for style ST150",
+    "Will we finish on time?",
+    "production for adidas",
+    "hello",
+    "efficiency of line 5 yesterday",
+    "how many days for ST100",
+    "target gap for line 3 last 30 days"
+]
+
+def export(pkl_path='nlp_model.pkl', out_path='nlp_model.npz'):
+    print(f"Loading {pkl_path}...")
+    pipeline = joblib.load(pkl_path)
+    tfidf = pipeline.named_steps['tfidf']
+    clf = pipeline.named_steps['clf']
+
+    if tfidf.analyzer != 'word' or tfidf.tokenizer or tfidf.preprocessor or tfidf.strip_accents:
+        raise ValueError("Only the default word analyzer is supported by IntentScorer.")
+    if len(clf.classes_) < 3:
+        raise ValueError("Binary classifiers are not supported (IntentScorer expects one row of weights per class).")
+
+    # Vocabulary as an array ordered by column index
+    terms = [None] * len(tfidf.vocabulary_)
+    for term, idx in tfidf.vocabulary_.items():
+        terms[idx] = term
+
+    np.savez_compressed(
+        out_path,
+        terms=np.array(terms),
+        idf=tfidf.idf_.astype(np.float64),
+        coef=clf.coef_.astype(np.float64),
+        intercept=clf.intercept_.astype(np.float64),
+        classes=np.array([str(c) for c in clf.classes_]),
+        stop_words=np.array(sorted(tfidf.get_stop_words() or [])),
+        token_pattern=np.array(tfidf.token_pattern),
+        ngram_range=np.array(tfidf.ngram_range),
+        lowercase=np.array(tfidf.lowercase),
+        norm=np.array(tfidf.norm or ''),
+        sublinear_tf=np.array(tfidf.sublinear_tf)
+    )
+    print(f"Intent model exported to '{out_path}' ({len(terms)} terms, {len(clf.classes_)} intents)")
+    return pipeline
+
+def verify(pipeline, npz_path='nlp_model.npz', n_samples=2000):
+    scorer = IntentScorer.load(npz_path)
+    texts = CHECK_QUERIES + generate_dataset(n_samples)['text'].tolist()
+    texts = [t.lower() for t in texts]  # QueryInterpreter lowercases before scoring
+
+    # TF-IDF vectors first (covers the sublinear_tf / norm options), then scores and intents
+    tfidf_diff = np.abs(pipeline.named_steps['tfidf'].transform(texts).toarray() - scorer.transform(texts)).max()
+
+    expected = pipeline.predict(texts)
+    actual = scorer.predict(texts)
+    mismatches = [(t, e, a) for t, e, a in zip(texts, expected, actual) if e != a]
+
+    max_diff = np.abs(pipeline.decision_function(texts) - scorer.decision_function(texts)).max()
+    print(f"Checked {len(texts)} queries: {len(mismatches)} intent mismatches, "
+          f"max tf-idf diff {tfidf_diff:.2e}, max score diff {max_diff:.2e}")
+    for text, e, a in mismatches[:10]:
+        print(f"  '{text}': pickle={e} npz={a}")
+    return not mismatches and tfidf_diff < 1e-9
+
+if __name__ == "__main__":
+    pipeline = export()
+    if not verify(pipeline):
+        sys.exit(1)
@@ -0,0 +1,167 @@
+import numpy as np
+import pandas as pd
+
+from features import FEATURE_COLS
+
+# Vectorized training features (train_model.py, feature_store.py).
+#
+# Rows are sorted once by (style, production_date, id). Every per-style
+# computation (cumulative achieved, the 7-row efficiency trend) then runs as
+# whole-array NumPy over the contiguous style segments instead of a Python
+# callback per groupby group. Inputs are kept compact: style/buyer as int32
+# category codes, measures as float32 (NULL -> NaN). Sums and ratios are taken
+# in float64 and the features emitted as float32, the dtype the ONNX model takes.
+
+TREND_WINDOW = 7
+
+HOUR_COLS = [f'hour_{i}' for i in range(1, 9)]
+MEASURE_COLS = [
+    'order_quantity', 'day_target', 'day_achieved', 'planned_fabric_meters',
+    'actual_fabric_used', 'rejection', 'line_no'
+] + HOUR_COLS
+
+# Everything except the label-encoded columns (encoders are fit at train time)
+NUMERIC_FEATURES = [c for c in FEATURE_COLS if c not in ('style_encoded', 'buyer_encoded')]
+
+
+def codes_of(values):
+    # -> (int32 codes, sorted categories); NULL -> -1
+    cat = pd.Categorical(values)
+    return cat.codes.astype(np.int32), np.asarray(cat.categories, dtype=object)
+
+
+def compact_columns(df):
+    """
+    production_data rows (DataFrame) -> dict of compact arrays:
+    id, production_date (datetime64[D]), style_code/styles, buyer_code/buyers, MEASURE_COLS as float32.
+    """
+    cols = {
+        'id': df['id'].to_numpy(np.int64) if 'id' in df else np.arange(len(df), dtype=np.int64),
+        'production_date': pd.to_datetime(df['production_date']).to_numpy().astype('datetime64[D]')
+    }
+    cols['style_code'], cols['styles'] = codes_of(df['style_no'])
+    cols['buyer_code'], cols['buyers'] = codes_of(df['buyer_name'])
+    for c in MEASURE_COLS:
+        cols[c] = pd.to_numeric(df[c], errors='coerce').to_numpy(np.float32, na_value=np.nan)
+    return cols
+
+
+def sort_rows(cols):
+    # One stable sort by (style, date, id); rows without a style are dropped (groupby drops them too)
+    rows = np.flatnonzero(cols['style_code'] >= 0)
+    rows = rows[np.argsort(cols['id'][rows], kind='stable')]  # near-free: rows usually arrive in id order
+
+    # (style, date) packed into one int64 key; NaT sorts last like in pandas
+    days = cols['production_date'][rows].astype(np.int64)
+    missing = np.isnat(cols['production_date'][rows])
+    if missing.all():
+        days = np.zeros(len(rows), dtype=np.int64)
+    else:
+        days = days - days[~missing].min()
+        days[missing] = days[~missing].max() + 1
+    key = cols['style_code'][rows].astype(np.int64) * (int(days.max(initial=0)) + 1) + days
+    order = rows[np.argsort(key, kind='stable')]
+    return {k: (v[order] if k not in ('styles', 'buyers') else v) for k, v in cols.items()}
+
+
+def segment_starts(codes):
+    if not len(codes):
+        return np.zeros(0, dtype=np.int64)
+    return np.flatnonzero(np.concatenate([[True], codes[1:] != codes[:-1]]))
+
+
+def segment_positions(codes):
+    # Row index within its segment
+    starts = segment_starts(codes)
+    lengths = np.diff(np.append(starts, len(codes)))
+    return np.arange(len(codes)) - np.repeat(starts, lengths)
+
+
+def segment_cumsum(values, codes, offsets=None):
+    # Per-segment running sum; offsets[code] is added to the whole segment
+    starts = segment_starts(codes)
+    total = np.cumsum(values, dtype=np.float64)
+    before = np.concatenate([[0.0], total[starts[1:] - 1]])
+    out = total - np.repeat(before, np.diff(np.append(starts, len(values))))
+    if offsets is not None:
+        out += offsets[codes]
+    return out
+
+
+def segment_rolling_mean(values, codes, window=TREND_WINDOW, history=None, history_len=None):
+    """
+    Trailing mean per segment with min_periods=1, i.e.
+    groupby(codes).transform(lambda x: x.rolling(window, min_periods=1).mean()).
+    history: optional (n_codes, window - 1) earlier values per code, right-aligned
+    (newest last), with history_len[code] of them valid; the window continues over them.
+    """
+    pos = segment_positions(codes)
+    total = values.astype(np.float64)
+    count = np.ones(len(values))
+    for k in range(1, window):
+        inside = np.flatnonzero(pos >= k)
+        total[inside] += values[inside - k]
+        count[inside] += 1
+        if history is not None:
+            near = np.flatnonzero((pos < k) & (history_len[codes] >= k - pos))
+            total[near] += history[codes[near], window - 1 + pos[near] - k]
+            count[near] += 1
+    return total / count
+
+
+def _finite_or_zero(values):
+    return np.where(np.isfinite(values), values, 0.0)
+
+
+def engineer(cols, cum_offsets=None, history=None, history_len=None):
+    """
+    Features for rows already passed through sort_rows. The optional arguments
+    continue earlier rows of the same styles (feature_store.py): cum_offsets[code]
+    is the style's cumulative achieved so far, history/history_len its last
+    daily efficiencies (see segment_rolling_mean).
+    Returns {'keep': row mask, 'features': (n_kept, len(NUMERIC_FEATURES)) float32,
+    'daily_efficiency': kept rows, 'running_achieved': all rows}.
+    """
+    codes = cols['style_code']
+    achieved = cols['day_achieved']
+    missing = np.isnan(achieved)
+
+    # 1. Cumulative Achieved (NULL days don't add, and get no cumulative value)
+    running = segment_cumsum(np.where(missing, 0.0, achieved), codes, cum_offsets)
+    cumulative = np.where(missing, np.nan, running)
+
+    # 2. Remaining Quantity; completed orders are not training rows
+    remaining = cols['order_quantity'] - cumulative
+    keep = remaining > 0
+
+    # 3. Efficiency Trend over the kept rows
+    with np.errstate(divide='ignore', invalid='ignore'):
+        daily_eff = _finite_or_zero(achieved[keep].astype(np.float64) / cols['day_target'][keep])
+    trend = segment_rolling_mean(daily_eff, codes[keep], history=history, history_len=history_len)
+
+    # 4. Fabric Variance
+    planned = cols['planned_fabric_meters'][keep].astype(np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fabric_var = _finite_or_zero((cols['actual_fabric_used'][keep] - planned) / planned)
+
+    # 5. Hour Output Sum (NULL hours count as 0)
+    hour_output = np.zeros(int(keep.sum()))
+    for c in HOUR_COLS:
+        hour_output += np.nan_to_num(cols[c][keep])
+
+    values = {
+        'order_quantity': cols['order_quantity'][keep],
+        'cumulative_achieved': cumulative[keep],
+        'remaining_qty': remaining[keep],
+        'daily_efficiency': daily_eff,
+        'efficiency_trend': trend,
+        'fabric_variance': fabric_var,
+        'hour_output': hour_output,
+        'rejection': cols['rejection'][keep],
+        'line_no': cols['line_no'][keep]
+    }
+    features = np.empty((len(hour_output), len(NUMERIC_FEATURES)), dtype=np.float32)
+    for i, c in enumerate(NUMERIC_FEATURES):
+        features[:, i] = np.nan_to_num(values[c], nan=0.0)
+
+    return {'keep': keep, 'features': features, 'daily_efficiency': daily_eff, 'running_achieved': running}
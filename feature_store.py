@@ -0,0 +1,302 @@
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+import feature_engine
+from feature_engine import TREND_WINDOW
+
+# Cached training features for train_model.py.
+#
+# Engineered rows are kept in NumPy part files (feature_store/part-*.npz) next
+# to a small state file holding the id watermark and, per style, what the
+# features of the next row depend on: the running cumulative_achieved, the
+# last (date, id) and the last 6 daily efficiencies (efficiency_trend window).
+# update() then only reads rows with id > watermark; a style whose new rows
+# land before its latest cached row is recomputed from the DB instead.
+# Rows the watermark can't see (updated in place by natural-key upserts,
+# committed late with an id below it, deleted) are caught by a per-style
+# fingerprint (row count + XOR of row checksums) of everything up to the
+# watermark; styles whose fingerprint drifted are recomputed. Every read of
+# one update runs in a single consistent snapshot.
+#
+# Features match train_model.feature_engineering: rows per style in
+# (production_date, id) order, cumulative_achieved over all rows, rows with
+# remaining_qty <= 0 dropped before the 7-row efficiency_trend.
+# Rows without a production_date are left out (they have no place in time).
+
+STORE_DIR = os.getenv('FEATURE_STORE_DIR', 'feature_store')
+FETCH_SIZE = 50000
+STYLES_PER_QUERY = 50
+
+HOUR_COLS = [f'hour_{i}' for i in range(1, 9)]
+SOURCE_COLUMNS = [
+    'id', 'style_no', 'buyer_name', 'production_date', 'order_quantity',
+    'day_target', 'day_achieved', 'planned_fabric_meters', 'actual_fabric_used',
+    'rejection', 'line_no'
+] + HOUR_COLS
+SELECT_SOURCE = f"SELECT {', '.join(SOURCE_COLUMNS)} FROM production_data"
+
+# Checksum of every source column of a row (IFNULL: CONCAT_WS would skip NULLs)
+ROW_CHECKSUM = "CRC32(CONCAT_WS('|', " + ', '.join(f"IFNULL({c}, '<null>')" for c in SOURCE_COLUMNS) + "))"
+
+# Per style: (rows, checksum) over all rows, and over rows with id <= %s
+FINGERPRINT_QUERY = f"""
+SELECT style_no, COUNT(*), BIT_XOR({ROW_CHECKSUM}),
+       SUM(id <= %s), BIT_XOR(IF(id <= %s, {ROW_CHECKSUM}, 0))
+FROM production_data
+WHERE style_no IS NOT NULL AND production_date IS NOT NULL
+GROUP BY style_no
+"""
+
+
+def compute_rows(rows, states=None):
+    """
+    Features for DB tuples (SOURCE_COLUMNS order) of any number of styles, in
+    one vectorized pass (feature_engine.py). Each style continues from
+    states[style] when given (its rows must then all come after that state).
+    Returns ([(style_no, kept columns)], {style_no: new state}).
+    """
+    states = states or {}
+    cols = feature_engine.sort_rows(feature_engine.compact_columns(pd.DataFrame.from_records(rows, columns=SOURCE_COLUMNS)))
+    styles = cols['styles']
+    codes = cols['style_code']
+
+    # Carry-over state as per-code arrays
+    offsets = np.zeros(len(styles))
+    history = np.zeros((len(styles), TREND_WINDOW - 1))
+    history_len = np.zeros(len(styles), dtype=np.int64)
+    for code, style in enumerate(styles):
+        state = states.get(style)
+        if state:
+            offsets[code] = state['cum']
+            recent = state['recent_eff'][-(TREND_WINDOW - 1):]
+            history_len[code] = len(recent)
+            if recent:
+                history[code, -len(recent):] = recent
+
+    result = feature_engine.engineer(cols, offsets, history, history_len)
+    keep = result['keep']
+    buyers = np.append(cols['buyers'], '').astype(str)  # code -1 (NULL) -> ''
+    kept_codes = codes[keep]
+    kept = {
+        'id': cols['id'][keep],
+        'production_date': cols['production_date'][keep],
+        'buyer_name': buyers[cols['buyer_code'][keep]],
+        'features': result['features'],
+        'target': np.nan_to_num(cols['day_achieved'][keep]).astype(np.float32)
+    }
+
+    pieces, new_states = [], {}
+    starts = feature_engine.segment_starts(codes)
+    ends = np.append(starts[1:], len(codes))
+    kept_starts = np.searchsorted(kept_codes, codes[starts])
+    kept_ends = np.searchsorted(kept_codes, codes[starts], side='right')
+    for start, end, k_start, k_end in zip(starts, ends, kept_starts, kept_ends):
+        code = codes[start]
+        style = styles[code]
+        recent = list(history[code, TREND_WINDOW - 1 - history_len[code]:]) + result['daily_efficiency'][k_start:k_end].tolist()
+        new_states[style] = {
+            'cum': float(result['running_achieved'][end - 1]),
+            'recent_eff': recent[-(TREND_WINDOW - 1):],
+            'last_date': str(cols['production_date'][end - 1]),
+            'last_id': int(cols['id'][end - 1])
+        }
+        pieces.append((style, {key: v[k_start:k_end] for key, v in kept.items()}))
+    return pieces, new_states
+
+
+class FeatureStore:
+    def __init__(self, path=STORE_DIR):
+        self.path = path
+        self.state_path = os.path.join(path, 'state.json')
+        self.state = {'max_id': 0, 'parts': [], 'styles': {}, 'next_part': 0}
+        if os.path.exists(self.state_path):
+            with open(self.state_path) as f:
+                self.state = json.load(f)
+
+    def _save_state(self):
+        tmp = self.state_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self.state_path)
+
+    def _write_part(self, pieces):
+        # pieces: [(style_no, kept columns)]
+        pieces = [(s, k) for s, k in pieces if len(k['id'])]
+        if not pieces:
+            return
+        name = f"part-{self.state['next_part']:05d}.npz"
+        self.state['next_part'] += 1
+        np.savez(
+            os.path.join(self.path, name),
+            style_no=np.concatenate([np.full(len(k['id']), s) for s, k in pieces]).astype(str),
+            **{key: np.concatenate([k[key] for _, k in pieces]) for key in ('id', 'production_date', 'buyer_name', 'features', 'target')}
+        )
+        self.state['parts'].append(name)
+
+    def _drop_styles(self, styles):
+        # Rewrite parts without the given styles (before recomputing them)
+        for name in list(self.state['parts']):
+            part_path = os.path.join(self.path, name)
+            with np.load(part_path) as part:
+                data = {k: part[k] for k in part.files}
+            mask = ~np.isin(data['style_no'], list(styles))
+            if mask.all():
+                continue
+            if mask.any():
+                np.savez(part_path, **{k: v[mask] for k, v in data.items()})
+            else:
+                os.remove(part_path)
+                self.state['parts'].remove(name)
+
+    def _compute_styles(self, conn, styles, max_id):
+        # Full history of `styles` (up to max_id) -> [(style, kept)], states
+        cursor = conn.cursor()
+        pieces = []
+        styles = sorted(styles)
+        for i in range(0, len(styles), STYLES_PER_QUERY):
+            chunk = styles[i:i + STYLES_PER_QUERY]
+            cursor.execute(
+                f"{SELECT_SOURCE} WHERE style_no IN ({', '.join(['%s'] * len(chunk))}) "
+                f"AND production_date IS NOT NULL AND id <= %s ORDER BY style_no, production_date, id",
+                chunk + [max_id]
+            )
+            rows = cursor.fetchall()
+            if rows:
+                chunk_pieces, states = compute_rows(rows)
+                pieces.extend(chunk_pieces)
+                self.state['styles'].update(states)
+        return pieces
+
+    def _fingerprints(self, conn, watermark):
+        # {style: [rows, checksum]} over all rows and over rows with id <= watermark
+        cursor = conn.cursor()
+        cursor.execute(FINGERPRINT_QUERY, (watermark, watermark))
+        current, below = {}, {}
+        for style, rows, checksum, rows_below, checksum_below in cursor.fetchall():
+            current[style] = [int(rows), int(checksum)]
+            if rows_below:
+                below[style] = [int(rows_below), int(checksum_below)]
+        return current, below
+
+    def rebuild(self, conn):
+        start = time.time()
+        os.makedirs(self.path, exist_ok=True)
+        for name in self.state['parts']:
+            part_path = os.path.join(self.path, name)
+            if os.path.exists(part_path):
+                os.remove(part_path)
+
+        conn.start_transaction(consistent_snapshot=True, readonly=True)
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT MAX(id) FROM production_data")
+            max_id = cursor.fetchone()[0] or 0
+            cursor.execute("SELECT DISTINCT style_no FROM production_data WHERE style_no IS NOT NULL")
+            styles = [r[0] for r in cursor.fetchall()]
+
+            self.state = {'max_id': max_id, 'parts': [], 'styles': {}, 'next_part': 0}
+            self.state['fingerprints'] = self._fingerprints(conn, max_id)[0]
+            for i in range(0, len(styles), STYLES_PER_QUERY * 10):
+                self._write_part(self._compute_styles(conn, styles[i:i + STYLES_PER_QUERY * 10], max_id))
+        finally:
+            conn.rollback()
+        self._save_state()
+        print(f"Feature store rebuilt: {len(self.state['styles'])} styles, {self.row_count()} rows in {time.time() - start:.1f}s")
+
+    def update(self, conn):
+        # Append features for rows with id > watermark; recompute styles that drifted below it
+        if not self.state['parts'] and not self.state['max_id']:
+            return self.rebuild(conn)
+        if 'fingerprints' not in self.state:
+            print("Feature store has no fingerprints (older format); rebuilding.")
+            return self.rebuild(conn)
+        start = time.time()
+        watermark = self.state['max_id']
+
+        conn.start_transaction(consistent_snapshot=True, readonly=True)
+        try:
+            current, below = self._fingerprints(conn, watermark)
+            stored = self.state['fingerprints']
+            drifted = {style for style in set(stored) | set(below) if stored.get(style) != below.get(style)}
+            # MySQL groups style_no case-insensitively; the store keeps each spelling
+            drifted_keys = {style.lower() for style in drifted}
+            drifted |= {style for style in self.state['styles'] if style.lower() in drifted_keys}
+
+            cursor = conn.cursor(buffered=False)
+            cursor.execute(f"{SELECT_SOURCE} WHERE id > %s AND production_date IS NOT NULL ORDER BY id", (watermark,))
+            new_rows = {}
+            max_id = watermark
+            while True:
+                rows = cursor.fetchmany(FETCH_SIZE)
+                if not rows:
+                    break
+                for row in rows:
+                    new_rows.setdefault(row[1], []).append(row)
+                    max_id = max(max_id, row[0])
+            if max_id == watermark and not drifted:
+                print("Feature store up to date.")
+                return
+
+            appended, recompute = [], set(drifted)
+            for style, rows in new_rows.items():
+                if style is None or style.lower() in drifted_keys:
+                    continue
+                state = self.state['styles'].get(style)
+                first = min(rows, key=lambda r: (r[3], r[0]))
+                if state and (str(first[3])[:10], first[0]) < (state['last_date'], state['last_id']):
+                    # Back-dated rows change the cumulative features of later rows
+                    recompute.add(style)
+                    continue
+                appended.extend(rows)
+
+            pieces = []
+            if appended:
+                pieces, states = compute_rows(appended, self.state['styles'])
+                self.state['styles'].update(states)
+
+            if recompute:
+                self._drop_styles(recompute)
+                for style in recompute:
+                    # Styles whose rows are all gone keep no state
+                    self.state['styles'].pop(style, None)
+                pieces.extend(self._compute_styles(conn, recompute, max_id))
+        finally:
+            conn.rollback()
+
+        self._write_part(pieces)
+        self.state['max_id'] = max_id
+        self.state['fingerprints'] = current
+        self._save_state()
+        print(
+            f"Feature store updated: {sum(len(r) for r in new_rows.values())} new rows, "
+            f"{len(recompute)} styles recomputed ({len(drifted)} changed below the watermark), "
+            f"watermark {watermark} -> {max_id} in {time.time() - start:.1f}s"
+        )
+
+    def row_count(self):
+        total = 0
+        for name in self.state['parts']:
+            with np.load(os.path.join(self.path, name)) as part:
+                total += len(part['id'])
+        return total
+
+    def load(self):
+        """
+        All cached rows, ordered by (style_no, production_date, id):
+        {'style_no', 'buyer_name', 'production_date', 'id', 'features' (N, len(NUMERIC_FEATURES)) float32, 'target'}
+        """
+        keys = ('style_no', 'buyer_name', 'production_date', 'id', 'features', 'target')
+        parts = {k: [] for k in keys}
+        for name in self.state['parts']:
+            with np.load(os.path.join(self.path, name)) as part:
+                for k in keys:
+                    parts[k].append(part[k])
+        if not self.state['parts']:
+            return None
+        data = {k: np.concatenate(v) for k, v in parts.items()}
+        order = np.lexsort((data['id'], data['production_date'], data['style_no']))
+        return {k: v[order] for k, v in data.items()}
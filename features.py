@@ -0,0 +1,170 @@
+import numpy as np
+
+from style_progress import WINDOW
+
+# Serving-time features for the order completion model.
+# Mirrors train_model.feature_engineering so served inputs match training.
+
+# Feature order expected by the ONNX model (mirrors train_model.py)
+FEATURE_COLS = [
+    'style_encoded', 'buyer_encoded', 'order_quantity',
+    'cumulative_achieved', 'remaining_qty', 'daily_efficiency',
+    'efficiency_trend', 'fabric_variance', 'hour_output', 'rejection', 'line_no'
+]
+
+# Keep IN (...) lists at a size MySQL plans well
+MAX_IN_CLAUSE = 500
+
+
+def chunked(values, size=MAX_IN_CLAUSE):
+    values = list(values)
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def recent_snapshots_query(style_nos, window=WINDOW):
+    # Last `window` snapshots per style, oldest first within each style
+    placeholders = ', '.join(['%s'] * len(style_nos))
+    sql = f"""
+    SELECT * FROM (
+        SELECT p.*,
+               ROW_NUMBER() OVER (PARTITION BY style_no ORDER BY production_date DESC, id DESC) AS snapshot_rank
+        FROM production_data p
+        WHERE style_no IN ({placeholders})
+    ) recent
+    WHERE snapshot_rank <= %s
+    ORDER BY style_no, snapshot_rank DESC
+    """
+    return sql, list(style_nos) + [window]
+
+
+def cumulative_totals_query(style_nos):
+    placeholders = ', '.join(['%s'] * len(style_nos))
+    sql = f"""
+    SELECT style_no, SUM(day_achieved) as total_produced
+    FROM production_data WHERE style_no IN ({placeholders})
+    GROUP BY style_no
+    """
+    return sql, list(style_nos)
+
+
+def group_recent_snapshots(rows, snapshots=None):
+    # Rows from recent_snapshots_query -> {style_no.lower(): [rows oldest -> newest]}
+    snapshots = {} if snapshots is None else snapshots
+    for row in rows:
+        row.pop('snapshot_rank', None)
+        snapshots.setdefault(row['style_no'].lower(), []).append(row)
+    return snapshots
+
+
+def fetch_recent_snapshots(conn, style_nos, window=WINDOW):
+    # One windowed query per chunk of styles
+    snapshots = {}
+    cursor = conn.cursor(dictionary=True)
+    for chunk in chunked(style_nos):
+        cursor.execute(*recent_snapshots_query(chunk, window))
+        group_recent_snapshots(cursor.fetchall(), snapshots)
+    return snapshots
+
+
+def fetch_cumulative_totals(conn, style_nos):
+    # {style_no.lower(): SUM(day_achieved)} with one grouped query per chunk
+    totals = {}
+    cursor = conn.cursor(dictionary=True)
+    for chunk in chunked(style_nos):
+        cursor.execute(*cumulative_totals_query(chunk))
+        for r in cursor.fetchall():
+            totals[r['style_no'].lower()] = r['total_produced'] or 0
+    return totals
+
+
+def daily_efficiency(achieved, target):
+    # achieved / target, 0 where the target is missing (same as training)
+    achieved = np.asarray(achieved, dtype=np.float64)
+    target = np.asarray(target, dtype=np.float64)
+    return np.divide(achieved, target, out=np.zeros_like(achieved), where=target != 0)
+
+
+def efficiency_trends(snapshot_lists, window=WINDOW):
+    # Rolling mean of daily efficiency over each style's last `window` snapshots
+    # (min_periods=1, like the training rolling mean). Returns shape (N,)
+    n = len(snapshot_lists)
+    achieved = np.zeros((n, window), dtype=np.float64)
+    target = np.zeros((n, window), dtype=np.float64)
+    present = np.zeros((n, window), dtype=bool)
+    for i, snaps in enumerate(snapshot_lists):
+        recent = snaps[-window:]
+        k = len(recent)
+        if not k:
+            continue
+        achieved[i, :k] = [float(r['day_achieved'] or 0) for r in recent]
+        target[i, :k] = [float(r['day_target'] or 0) for r in recent]
+        present[i, :k] = True
+
+    eff = daily_efficiency(achieved, target)
+    counts = present.sum(axis=1)
+    sums = np.where(present, eff, 0).sum(axis=1)
+    return np.divide(sums, counts, out=np.zeros(n, dtype=np.float64), where=counts > 0)
+
+
+def build_feature_matrix(rows, totals, trends, encoders):
+    # Vectorized (N, 11) float32 feature matrix for the latest snapshot rows
+    # Returns (features, remaining_qty, efficiency_trend)
+    def col(name):
+        return np.array([float(r[name] or 0) for r in rows], dtype=np.float64)
+
+    # 1. Encoders (Handle unseen labels gracefully)
+    style_enc = np.array([encoders['style_map'].get(str(r['style_no']), 0) for r in rows], dtype=np.float64)
+    buyer_enc = np.array([encoders['buyer_map'].get(str(r['buyer_name']), 0) for r in rows], dtype=np.float64)
+
+    # 2. Calculated features
+    order_qty = col('order_quantity')
+    total_produced = np.array([float(t or 0) for t in totals], dtype=np.float64)
+    remaining = np.maximum(0, order_qty - total_produced)
+
+    daily_eff = daily_efficiency(col('day_achieved'), col('day_target'))
+
+    # Styles without a computed trend fall back to the current daily efficiency
+    eff_trend = np.array([np.nan if t is None else float(t) for t in trends], dtype=np.float64)
+    eff_trend = np.where(np.isnan(eff_trend), daily_eff, eff_trend)
+
+    planned = col('planned_fabric_meters')
+    actual = col('actual_fabric_used')
+    fabric_var = np.divide(actual - planned, planned, out=np.zeros_like(planned), where=planned != 0)
+
+    hour_output = sum(col(f'hour_{i}') for i in range(1, 9))
+
+    features = np.empty((len(rows), len(FEATURE_COLS)), dtype=np.float32)
+    features[:, 0] = style_enc
+    features[:, 1] = buyer_enc
+    features[:, 2] = order_qty
+    features[:, 3] = total_produced
+    features[:, 4] = remaining
+    features[:, 5] = daily_eff
+    features[:, 6] = eff_trend
+    features[:, 7] = fabric_var
+    features[:, 8] = hour_output
+    features[:, 9] = col('rejection')
+    features[:, 10] = col('line_no')
+    return features, remaining, eff_trend
+
+
+def combine_snapshots(recent, totals):
+    # {key: (latest row, total_produced, efficiency_trend)}
+    keys = list(recent.keys())
+    trends = efficiency_trends([recent[k] for k in keys])
+    return {
+        key: (recent[key][-1], totals.get(key, 0), float(trends[i]))
+        for i, key in enumerate(keys)
+    }
+
+
+def load_snapshots(conn, style_nos):
+    # Latest snapshot, cumulative total and 7-snapshot efficiency trend for
+    # one or many styles, using two set-based queries in total.
+    # Returns {style_no.lower(): (row, total_produced, efficiency_trend)}
+    recent = fetch_recent_snapshots(conn, style_nos)
+    if not recent:
+        return {}
+    totals = fetch_cumulative_totals(conn, list(recent.keys()))
+    return combine_snapshots(recent, totals)
@@ -1,9 +1,12 @@
 import mysql.connector
-import random
-from datetime import datetime, timedelta
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
 import os
+import ingest_engine
+import bulk_loader
 
 # Database Configuration
 DB_CONFIG = {
@@ -47,85 +50,129 @@ def create_table(conn):
     conn.commit()
     print("Schema created successfully.")
 
-def generate_dummy_data(num_rows=1000000):
+BUYERS = ['H&M', 'Zara', 'Gap', 'Nike', 'Adidas', 'Puma', 'Uniqlo']
+STYLES = [f'ST{i}' for i in range(100, 200)]
+FABRICS = ['Single Jersey', 'Fleece', 'Rib', 'Interlock', 'Pique']
+COLORS = ['Red', 'Blue', 'Black', 'White', 'Green', 'Yellow', 'Grey']
+START_DATE = np.datetime64('2023-01-01')
+
+def generate_columns(num_rows, rng):
+    # One columnar batch as NumPy arrays, keyed by INSERT_COLUMNS.
+    # Same distributions as the original row-by-row generator
+    # (integers(a, b + 1) == random.randint(a, b)).
+    def pick(values):
+        return np.array(values)[rng.integers(0, len(values), num_rows)]
+
+    target = rng.integers(800, 1201, num_rows)
+
+    # Hourly production with some logic
+    hours = rng.integers(50, 151, (num_rows, 8))
+    achieved = hours.sum(axis=1)
+
+    fabric_planned = achieved * 0.25  # Approx 250g per garment
+    fabric_actual = fabric_planned * rng.uniform(0.95, 1.10, num_rows)  # 5% less to 10% more
+
+    columns = {
+        'order_no': np.char.add('ORD', rng.integers(10000, 100000, num_rows).astype(str)),
+        'buyer_name': pick(BUYERS),
+        'style_no': pick(STYLES),
+        'order_quantity': rng.integers(1000, 50001, num_rows),
+        'production_date': (START_DATE + rng.integers(0, 731, num_rows)).astype(str),
+        'day_target': target,
+        'day_achieved': achieved
+    }
+    for i in range(8):
+        columns[f'hour_{i + 1}'] = hours[:, i]
+    columns.update({
+        'fabric_type': pick(FABRICS),
+        'fabric_gsm': rng.integers(140, 301, num_rows),
+        'color': pick(COLORS),
+        'planned_fabric_meters': np.round(fabric_planned, 2),
+        'actual_fabric_used': np.round(fabric_actual, 2),
+        'rejection': rng.integers(0, 51, num_rows),
+        'rework': rng.integers(0, 101, num_rows),
+        'planned_cut_quantity': target + 100,
+        'actual_cut_quantity': achieved + rng.integers(0, 51, num_rows),
+        'operator_code': np.char.add('OP', rng.integers(1, 501, num_rows).astype(str)),
+        'line_no': rng.integers(1, 21, num_rows)
+    })
+    return columns
+
+def columns_to_rows(columns):
+    # Columnar batch -> list of plain-Python tuples in INSERT_COLUMNS order
+    return list(zip(*(columns[col].tolist() for col in INSERT_COLUMNS)))
+
+def generate_batch(task):
+    # Batch `index` always comes from the same seed stream, so the dataset is
+    # identical whatever the number of worker processes.
+    # Returns columns (cheap to pickle back from a worker, unlike tuples)
+    index, num_rows, seed = task
+    rng = np.random.default_rng([seed, index]) if seed is not None else np.random.default_rng()
+    return generate_columns(num_rows, rng)
+
+def generate_dummy_data(num_rows=1000000, batch_size=5000, seed=None, workers=1):
     print(f"Generating {num_rows} rows of data...")
     
-    buyers = ['H&M', 'Zara', 'Gap', 'Nike', 'Adidas', 'Puma', 'Uniqlo']
-    styles = [f'ST{i}' for i in range(100, 200)]
-    fabrics = ['Single Jersey', 'Fleece', 'Rib', 'Interlock', 'Pique']
-    colors = ['Red', 'Blue', 'Black', 'White', 'Green', 'Yellow', 'Grey']
-    start_date = datetime(2023, 1, 1)
+    tasks = [
+        (index, min(batch_size, num_rows - start), seed)
+        for index, start in enumerate(range(0, num_rows, batch_size))
+    ]
     
-    data = []
-    
-    # Batch generation for memory efficiency
-    batch_size = 5000
-    
-    for _ in tqdm(range(0, num_rows, batch_size)):
-        batch_data = []
-        for _ in range(batch_size):
-            if len(data) + len(batch_data) >= num_rows:
-                break
-                
-            date = start_date + timedelta(days=random.randint(0, 730))
-            buyer = random.choice(buyers)
-            style = random.choice(styles)
-            line = random.randint(1, 20)
-            target = random.randint(800, 1200)
-            
-            # Hourly production with some logic
-            hours = [random.randint(50, 150) for _ in range(8)]
-            achieved = sum(hours)
-            
-            fabric_planned = achieved * 0.25  # Approx 250g per garment
-            fabric_actual = fabric_planned * random.uniform(0.95, 1.10) # 5% less to 10% more
-            
-            batch_data.append((
-                f"ORD{random.randint(10000, 99999)}",
-                buyer,
-                style,
-                random.randint(1000, 50000), # order_quantity
-                date.strftime('%Y-%m-%d'),
-                target,
-                achieved,
-                hours[0], hours[1], hours[2], hours[3], hours[4], hours[5], hours[6], hours[7],
-                random.choice(fabrics),
-                random.randint(140, 300), # gsm
-                random.choice(colors),
-                round(fabric_planned, 2),
-                round(fabric_actual, 2),
-                random.randint(0, 50), # rejection
-                random.randint(0, 100), # rework
-                target + 100, # planned_cut
-                achieved + random.randint(0, 50), # actual_cut
-                f"OP{random.randint(1, 500)}",
-                line
-            ))
-        yield batch_data
-
-def insert_data(conn):
-    cursor = conn.cursor()
-    query = """
-    INSERT INTO production_data (
-        order_no, buyer_name, style_no, order_quantity, production_date,
-        day_target, day_achieved, hour_1, hour_2, hour_3, hour_4, 
-        hour_5, hour_6, hour_7, hour_8, fabric_type, fabric_gsm, 
-        color, planned_fabric_meters, actual_fabric_used, rejection, 
-        rework, planned_cut_quantity, actual_cut_quantity, operator_code, line_no
-    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-    """
+    if workers <= 1:
+        for task in tqdm(tasks):
+            yield columns_to_rows(generate_batch(task))
+        return
     
+    # Sharded generation; only a few batches ahead of the consumer are kept in memory
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        window = workers * 2
+        for i in tqdm(range(0, len(tasks), window)):
+            for columns in pool.map(generate_batch, tasks[i:i + window]):
+                yield columns_to_rows(columns)
+
+# Column order of the tuples produced by generate_dummy_data
+INSERT_COLUMNS = [
+    'order_no', 'buyer_name', 'style_no', 'order_quantity', 'production_date',
+    'day_target', 'day_achieved', 'hour_1', 'hour_2', 'hour_3', 'hour_4',
+    'hour_5', 'hour_6', 'hour_7', 'hour_8', 'fabric_type', 'fabric_gsm',
+    'color', 'planned_fabric_meters', 'actual_fabric_used', 'rejection',
+    'rework', 'planned_cut_quantity', 'actual_cut_quantity', 'operator_code', 'line_no'
+]
+
+def insert_data(conn, num_rows=1000000, seed=None, workers=1, batch_size=5000):
+    # Upserts on the natural key: random keys occasionally repeat, and a
+    # re-run with the same --seed updates rows instead of duplicating them
     count = 0
-    for batch in generate_dummy_data(1000000):
-        cursor.executemany(query, batch)
-        conn.commit()
+    for batch in generate_dummy_data(num_rows, batch_size=batch_size, seed=seed, workers=workers):
+        # Derived tables (style_progress, rollup) are kept up to date in the same transaction
+        ingest_engine.write_with_retry(conn, INSERT_COLUMNS, batch)
         count += len(batch)
         print(f"Inserted {count} rows...")
 
+def bulk_insert_data(num_rows=1000000, seed=None, workers=1, batch_size=5000, defer_indexes=False):
+    # LOAD DATA LOCAL INFILE instead of executemany (see bulk_loader.py)
+    conn = bulk_loader.connect(DB_CONFIG)
+    rows = (row for batch in generate_dummy_data(num_rows, batch_size=batch_size, seed=seed, workers=workers) for row in batch)
+    bulk_loader.bulk_load(conn, rows, INSERT_COLUMNS, defer_indexes=defer_indexes)
+    conn.close()
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate and import synthetic production data.")
+    parser.add_argument('--rows', type=int, default=1000000, help="Number of rows to generate")
+    parser.add_argument('--seed', type=int, default=None, help="Seed for a reproducible dataset")
+    parser.add_argument('--workers', type=int, default=1, help="Generator processes")
+    parser.add_argument('--batch-size', type=int, default=5000, help="Rows per generated batch / INSERT")
+    parser.add_argument('--bulk', action='store_true', help="Load with LOAD DATA LOCAL INFILE")
+    parser.add_argument('--defer-indexes', action='store_true', help="Drop secondary indexes during a --bulk load")
+    args = parser.parse_args()
+
     conn = get_connection()
     if conn:
         create_table(conn)
-        insert_data(conn)
+        if args.bulk:
+            bulk_insert_data(args.rows, seed=args.seed, workers=args.workers, batch_size=args.batch_size,
+                             defer_indexes=args.defer_indexes)
+        else:
+            insert_data(conn, args.rows, seed=args.seed, workers=args.workers, batch_size=args.batch_size)
         conn.close()
         print("Data import complete.")
@@ -0,0 +1,132 @@
+import json
+import os
+import re
+import sys
+from collections import OrderedDict
+
+import mysql.connector
+
+import rollup
+from db_pool import DB_CONFIG
+
+# Replays logged /ask queries (QUERY_LOG_PATH, one JSON object per line) through
+# EXPLAIN and reports, per query shape, the access path MySQL picks: which
+# index, estimated rows, and whether it falls back to a full scan.
+#
+#   python index_advisor.py query_log.jsonl
+#   python index_advisor.py --sample      # shapes QueryInterpreter can emit, no log needed
+
+TABLES = ['production_data', rollup.ROLLUP_TABLE]
+
+# EXPLAIN access types that read the whole table / index
+FULL_SCAN_TYPES = {'ALL', 'index'}
+
+
+def shape_of(sql):
+    return re.sub(r'\s+', ' ', sql).strip()
+
+
+def load_log(path):
+    # {shape: {'sql', 'params', 'count', 'total_ms'}} in first-seen order
+    shapes = OrderedDict()
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            shape = shape_of(entry['sql'])
+            stat = shapes.setdefault(shape, {'sql': entry['sql'], 'params': entry.get('params') or [], 'count': 0, 'total_ms': 0.0})
+            stat['count'] += 1
+            stat['total_ms'] += entry.get('duration_ms') or 0
+    return shapes
+
+
+def sample_shapes(conn):
+    # One query per metric x filter x (dated / all time), using real filter values
+    from query_interpreter import QueryInterpreter
+    cursor = conn.cursor()
+    cursor.execute("SELECT buyer_name, style_no, line_no, fabric_type, production_date FROM production_data ORDER BY id DESC LIMIT 1")
+    buyer, style, line, fabric, last = cursor.fetchone()
+
+    nlp = QueryInterpreter(lazy=True)
+    filter_sets = [{}, {'buyer_name': buyer}, {'style_no': style}, {'line_no': line}, {'fabric_type': fabric}]
+    date_range = {'start': str(last), 'end': str(last)}
+    shapes = OrderedDict()
+    for metric in nlp.metrics:
+        for filters in filter_sets:
+            for dates in (date_range, None):
+                for use_rollup in (False, True):
+                    sql, params = nlp.build_sql(metric, filters, dates, use_rollup)
+                    shapes.setdefault(shape_of(sql), {'sql': sql, 'params': params, 'count': 1, 'total_ms': 0.0})
+    return shapes
+
+
+def explain(cursor, sql, params):
+    cursor.execute("EXPLAIN " + sql, params)
+    return cursor.fetchall()
+
+
+def table_indexes(cursor, table):
+    try:
+        cursor.execute(f"SHOW INDEX FROM {table}")
+    except mysql.connector.Error:
+        return []
+    names = []
+    for row in cursor.fetchall():
+        if row['Key_name'] not in names:
+            names.append(row['Key_name'])
+    return names
+
+
+def report(conn, shapes):
+    cursor = conn.cursor(dictionary=True)
+    used = {table: {} for table in TABLES}
+    full_scans = []
+
+    print(f"{len(shapes)} query shapes\n")
+    for shape, stat in sorted(shapes.items(), key=lambda item: -item[1]['total_ms']):
+        try:
+            plan = explain(cursor, stat['sql'], stat['params'])
+        except mysql.connector.Error as e:
+            print(f"[ERROR] {shape}\n        {e}\n")
+            continue
+
+        avg_ms = stat['total_ms'] / stat['count'] if stat['count'] else 0
+        print(f"x{stat['count']} avg {avg_ms:.1f} ms  {shape}")
+        for step in plan:
+            table, key = step.get('table'), step.get('key')
+            full = step.get('type') in FULL_SCAN_TYPES
+            print(f"        table={table} type={step.get('type')} key={key} rows~{step.get('rows')} {step.get('Extra') or ''}")
+            if table in used and key:
+                used[table][key] = used[table].get(key, 0) + stat['count']
+            if full:
+                full_scans.append((shape, table, stat['count']))
+        print()
+
+    print("Full scans:")
+    if not full_scans:
+        print("  none")
+    for shape, table, count in full_scans:
+        print(f"  x{count} {table}: {shape}")
+
+    print("\nIndex usage:")
+    for table in TABLES:
+        for name in table_indexes(cursor, table):
+            hits = used[table].get(name, 0)
+            print(f"  {table}.{name}: {hits} queries" + ("" if hits else "  (unused by this workload)"))
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    conn = mysql.connector.connect(**DB_CONFIG)
+    if args == ['--sample']:
+        shapes = sample_shapes(conn)
+    else:
+        path = args[0] if args else os.getenv('QUERY_LOG_PATH', 'query_log.jsonl')
+        if not os.path.exists(path):
+            print(f"No query log at '{path}'. Set QUERY_LOG_PATH on the API or use --sample.")
+            sys.exit(1)
+        shapes = load_log(path)
+    report(conn, shapes)
+    conn.close()
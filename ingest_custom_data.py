@@ -3,6 +3,8 @@ import mysql.connector
 from datetime import datetime
 import sys
 import os
+import bulk_loader
+import ingest_engine
 
 # DB Config
 DB_CONFIG = {
@@ -12,101 +14,160 @@ DB_CONFIG = {
     'database': 'garment_db'
 }
 
+# Rows parsed per chunk (memory stays bounded by a few chunks)
+CHUNK_SIZE = int(os.getenv('INGEST_CHUNK_SIZE', 50000))
+
+# Standardize Column Names (Simple mapping)
+# Map user columns to DB columns if they differ
+column_mapping = {
+    'Order No': 'order_no', 'Buyer': 'buyer_name', 'Style': 'style_no',
+    'Quantity': 'order_quantity', 'Date': 'production_date',
+    'Target': 'day_target', 'Achieved': 'day_achieved',
+    'Fabric': 'fabric_type', 'GSM': 'fabric_gsm',
+    'Used Fabric': 'actual_fabric_used', 'Planned Fabric': 'planned_fabric_meters',
+    'Rejection': 'rejection', 'Rework': 'rework', 'Line': 'line_no'
+}
+
+required_cols = ['buyer_name', 'style_no', 'day_achieved', 'line_no']
+
+insert_columns = [
+    'order_no', 'buyer_name', 'style_no', 'order_quantity', 'production_date',
+    'day_target', 'day_achieved', 'fabric_type', 'fabric_gsm',
+    'planned_fabric_meters', 'actual_fabric_used', 'rejection',
+    'rework', 'line_no'
+]
+
+# Defaults for columns missing from the file
+column_defaults = {
+    'order_no': '', 'buyer_name': 'Unknown', 'style_no': 'Unknown', 'fabric_type': 'Unknown',
+    'order_quantity': 0, 'day_target': 0, 'day_achieved': 0, 'fabric_gsm': 0,
+    'planned_fabric_meters': 0, 'actual_fabric_used': 0, 'rejection': 0,
+    'rework': 0, 'line_no': 0
+}
+
+int_columns = ['order_quantity', 'day_target', 'day_achieved', 'fabric_gsm', 'rejection', 'rework', 'line_no']
+float_columns = ['planned_fabric_meters', 'actual_fabric_used']
+
 def get_db_connection():
     return mysql.connector.connect(**DB_CONFIG)
 
-def ingest_data(file_path):
+def read_excel_chunks(file_path, chunk_size):
+    # openpyxl read-only mode streams rows instead of loading the whole sheet
+    from openpyxl import load_workbook
+    wb = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        header = [str(h) if h is not None else '' for h in header]
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield pd.DataFrame(chunk, columns=header)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=header)
+    finally:
+        wb.close()
+
+def read_chunks(file_path, chunk_size=CHUNK_SIZE):
+    if file_path.endswith('.csv'):
+        return pd.read_csv(file_path, chunksize=chunk_size)
+    if file_path.endswith('.xlsx'):
+        return read_excel_chunks(file_path, chunk_size)
+    raise ValueError("Unsupported file format. Please use CSV or Excel.")
+
+def parse_dates(values):
+    # Per-element formats: factory exports mix 2024-01-05 / 05/01/2024 / Excel datetimes
+    try:
+        return pd.to_datetime(values, errors='coerce', format='mixed')
+    except (TypeError, ValueError):
+        # pandas < 2.0 has no format='mixed' (and already parses per element)
+        return pd.to_datetime(values, errors='coerce')
+
+def prepare_chunk(df):
+    # One chunk -> list of tuples in insert_columns order, converted column-wise
+    df = df.rename(columns=column_mapping)
+    out = pd.DataFrame(index=df.index)
+
+    for col in insert_columns:
+        if col == 'production_date':
+            # Handle Date Format
+            if col in df.columns:
+                dates = parse_dates(df[col])
+                out[col] = dates.dt.strftime('%Y-%m-%d').where(dates.notna(), None)
+            else:
+                out[col] = datetime.now().strftime('%Y-%m-%d')
+        elif col not in df.columns:
+            out[col] = column_defaults[col]
+        elif col in int_columns:
+            out[col] = pd.to_numeric(df[col], errors='coerce').round().astype('Int64')
+        elif col in float_columns:
+            out[col] = pd.to_numeric(df[col], errors='coerce')
+        else:
+            out[col] = df[col]
+
+    # Missing / unparseable cells -> NULL
+    out = out.astype(object).where(out.notna(), None)
+    return list(out.itertuples(index=False, name=None))
+
+def check_columns(chunks):
+    # Warn once if the file lacks essential columns
+    warned = False
+    for df in chunks:
+        if not warned and not all(col in df.rename(columns=column_mapping).columns for col in required_cols):
+            print("Warning: Missing one or more required columns: ", required_cols)
+            # In a real app, we'd do more complex mapping here
+            warned = True
+        yield df
+
+def prepare_rows(chunks):
+    for df in chunks:
+        yield from prepare_chunk(df)
+
+def ingest_data(file_path, bulk=False, defer_indexes=False, chunk_size=CHUNK_SIZE, workers=ingest_engine.WORKERS):
     if not os.path.exists(file_path):
         print(f"Error: File '{file_path}' not found.")
         return
 
-    print(f"Reading {file_path}...")
+    print(f"Reading {file_path} in chunks of {chunk_size} rows...")
     try:
-        if file_path.endswith('.csv'):
-            df = pd.read_csv(file_path)
-        elif file_path.endswith('.xlsx'):
-            df = pd.read_excel(file_path)
-        else:
-            print("Unsupported file format. Please use CSV or Excel.")
-            return
+        chunks = check_columns(read_chunks(file_path, chunk_size))
     except Exception as e:
         print(f"Error reading file: {e}")
         return
 
-    # Standardize Column Names (Simple mapping)
-    # Map user columns to DB columns if they differ
-    column_mapping = {
-        'Order No': 'order_no', 'Buyer': 'buyer_name', 'Style': 'style_no', 
-        'Quantity': 'order_quantity', 'Date': 'production_date', 
-        'Target': 'day_target', 'Achieved': 'day_achieved',
-        'Fabric': 'fabric_type', 'GSM': 'fabric_gsm', 
-        'Used Fabric': 'actual_fabric_used', 'Planned Fabric': 'planned_fabric_meters',
-        'Rejection': 'rejection', 'Rework': 'rework', 'Line': 'line_no'
-    }
-    
-    df.rename(columns=column_mapping, inplace=True)
-    
-    # Fill missing essential columns with defaults or drop
-    required_cols = ['buyer_name', 'style_no', 'day_achieved', 'line_no']
-    if not all(col in df.columns for col in required_cols):
-        print("Warning: Missing one or more required columns: ", required_cols)
-        # In a real app, we'd do more complex mapping here
-    
-    # DB Connection
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
     print("Inserting data into MySQL...")
-    # Prepare INSERT statement
-    # This assumes the CSV has matching columns to the DB or a subset.
-    # For simplicity, we'll iterate and insert specific fields we care about for training
-    
-    query = """
-    INSERT INTO production_data (
-        buyer_name, style_no, order_quantity, production_date,
-        day_target, day_achieved, fabric_type, fabric_gsm, 
-        planned_fabric_meters, actual_fabric_used, rejection, 
-        rework, line_no
-    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-    """
-    
-    batch_data = []
-    batch_size = 5000
-    
-    for _, row in df.iterrows():
-        # Handle Date Format
-        prod_date = row.get('production_date', datetime.now().strftime('%Y-%m-%d'))
-        
-        batch_data.append((
-            row.get('buyer_name', 'Unknown'),
-            row.get('style_no', 'Unknown'),
-            row.get('order_quantity', 0),
-            prod_date,
-            row.get('day_target', 0),
-            row.get('day_achieved', 0),
-            row.get('fabric_type', 'Unknown'),
-            row.get('fabric_gsm', 0),
-            row.get('planned_fabric_meters', 0),
-            row.get('actual_fabric_used', 0),
-            row.get('rejection', 0),
-            row.get('rework', 0),
-            row.get('line_no', 0)
-        ))
-        
-        if len(batch_data) >= batch_size:
-            cursor.executemany(query, batch_data)
-            conn.commit()
-            batch_data = []
-            
-    if batch_data:
-        cursor.executemany(query, batch_data)
-        conn.commit()
-        
-    conn.close()
+
+    if bulk:
+        # Keys already in the table are skipped (LOAD DATA LOCAL ignores duplicate keys)
+        conn = bulk_loader.connect(DB_CONFIG)
+        bulk_loader.bulk_load(conn, prepare_rows(chunks), insert_columns, defer_indexes=defer_indexes)
+        conn.close()
+        print("Data ingestion complete.")
+        return
+
+    # Upserts on the natural key with parallel writers (see ingest_engine.py);
+    # the next chunk is parsed while the workers write the previous one
+    try:
+        ingest_engine.ingest(
+            (prepare_chunk(df) for df in chunks),
+            insert_columns,
+            connect=get_db_connection,
+            workers=workers,
+            reject_path=file_path + '.rejected.csv'
+        )
+    except Exception as e:
+        print(f"Error inserting data: {e}")
+        return
     print("Data ingestion complete.")
 
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
-        ingest_data(sys.argv[1])
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    workers = next((int(a.split('=', 1)[1]) for a in sys.argv[1:] if a.startswith('--workers=')), ingest_engine.WORKERS)
+    if args:
+        ingest_data(args[0], bulk='--bulk' in sys.argv, defer_indexes='--defer-indexes' in sys.argv, workers=workers)
     else:
-        print("Usage: python ingest_custom_data.py <path_to_file>")
+        print("Usage: python ingest_custom_data.py <path_to_file> [--workers=N] [--bulk [--defer-indexes]]")
@@ -0,0 +1,258 @@
+import csv
+import os
+import queue
+import threading
+import time
+import zlib
+
+import mysql.connector
+
+import ingest_hooks
+
+# Idempotent, parallel writes into production_data.
+#
+# Rows are identified by the natural key (style_no, line_no, production_date,
+# order_no) backed by uq_natural_key (migrations/002_natural_key.sql), so
+# re-loading the same export updates rows in place instead of duplicating them.
+# Invalid rows are rejected to a side file instead of failing the load.
+#
+# Rows are partitioned across writer workers by style_no: a key (and every
+# style_progress / rollup row it feeds) is only ever written by one worker,
+# so workers don't contend for the same rows and file order is preserved
+# per key (the last occurrence wins).
+
+NATURAL_KEY = ['style_no', 'line_no', 'production_date', 'order_no']
+
+WORKERS = int(os.getenv('INGEST_WORKERS', 4))
+BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', 5000))
+MAX_RETRIES = 5
+
+# Deadlock / lock wait timeout: the transaction was rolled back, safe to retry
+RETRYABLE_ERRORS = {1213, 1205}
+# Duplicate entry for a unique key
+ER_DUP_ENTRY = 1062
+
+
+def insert_query(columns):
+    return (
+        f"INSERT INTO production_data ({', '.join(columns)}) "
+        f"VALUES ({', '.join(['%s'] * len(columns))})"
+    )
+
+
+def upsert_query(columns):
+    updates = ', '.join(f"{col} = VALUES({col})" for col in columns if col not in NATURAL_KEY)
+    return f"{insert_query(columns)} ON DUPLICATE KEY UPDATE {updates}"
+
+
+def key_of(style_no, line_no, production_date, order_no):
+    # Same equality MySQL applies to the unique key (case-insensitive, trailing spaces ignored)
+    return (
+        str(style_no).rstrip().lower(),
+        int(line_no),
+        str(production_date)[:10],
+        str(order_no or '').rstrip().lower()
+    )
+
+
+def validate(columns, rows):
+    """
+    Returns (valid rows with order_no defaulted to '', [(row, reason)] rejects).
+    """
+    idx = {col: i for i, col in enumerate(columns)}
+    missing = [col for col in NATURAL_KEY if col not in idx]
+    if missing:
+        raise ValueError(f"Columns missing for the natural key: {missing}")
+
+    valid, rejected = [], []
+    for row in rows:
+        reason = None
+        if not row[idx['style_no']] or not str(row[idx['style_no']]).strip():
+            reason = "missing style_no"
+        elif row[idx['production_date']] is None:
+            reason = "missing or invalid production_date"
+        elif row[idx['line_no']] is None:
+            reason = "missing line_no"
+        else:
+            for col in ('day_target', 'day_achieved', 'order_quantity', 'rejection'):
+                if col in idx and row[idx[col]] is not None and row[idx[col]] < 0:
+                    reason = f"negative {col}"
+                    break
+        if reason:
+            rejected.append((row, reason))
+            continue
+        if row[idx['order_no']] is None:
+            row = list(row)
+            row[idx['order_no']] = ''
+            row = tuple(row)
+        valid.append(row)
+    return valid, rejected
+
+
+def key_ids(conn, columns, rows):
+    # {natural key: id} for the keys from `rows` that are in production_data
+    idx = [columns.index(col) for col in NATURAL_KEY]
+    cursor = conn.cursor()
+    found = {}
+    for i in range(0, len(rows), 500):
+        chunk = rows[i:i + 500]
+        params = []
+        for row in chunk:
+            params.extend(row[j] for j in idx)
+        placeholders = ', '.join(['(%s, %s, %s, %s)'] * len(chunk))
+        cursor.execute(
+            f"SELECT id, {', '.join(NATURAL_KEY)} FROM production_data "
+            f"WHERE ({', '.join(NATURAL_KEY)}) IN ({placeholders})",
+            params
+        )
+        for r in cursor.fetchall():
+            found[key_of(*r[1:])] = r[0]
+    return found
+
+
+def upsert_batch(conn, columns, rows):
+    """
+    Writes one batch of valid rows (no commit). New keys are inserted and
+    folded into the derived tables incrementally; keys that already exist are
+    updated in place and their styles/days recomputed.
+    Returns (inserted, updated).
+    """
+    idx = [columns.index(col) for col in NATURAL_KEY]
+
+    # Duplicates inside the batch: the last occurrence wins
+    latest = {}
+    for row in rows:
+        latest[key_of(*(row[j] for j in idx))] = row
+    rows = list(latest.values())
+
+    existing = key_ids(conn, columns, rows)
+    new_rows = [row for key, row in latest.items() if key not in existing]
+    updated_rows = [row for key, row in latest.items() if key in existing]
+
+    cursor = conn.cursor()
+    touched = list(updated_rows)
+    inserted = len(new_rows)
+
+    if new_rows:
+        try:
+            # Plain INSERT: either every row is new, or the statement fails as a whole
+            cursor.executemany(insert_query(columns), new_rows)
+        except mysql.connector.Error as err:
+            if err.errno != ER_DUP_ENTRY:
+                raise
+            # A concurrent writer inserted some of these keys first
+            touched.extend(new_rows)
+            inserted = 0
+        else:
+            # Ids are read back by key: AUTO_INCREMENT ids of one multi-row
+            # INSERT are not consecutive under concurrent inserts
+            ids = key_ids(conn, columns, new_rows)
+            ingest_hooks.after_insert(
+                conn, columns, new_rows,
+                [ids[key_of(*(row[j] for j in idx))] for row in new_rows]
+            )
+
+    if touched:
+        cursor.executemany(upsert_query(columns), touched)
+        ingest_hooks.after_update(conn, columns, touched)
+    return inserted, len(touched)
+
+
+def write_with_retry(conn, columns, rows):
+    for attempt in range(MAX_RETRIES):
+        try:
+            result = upsert_batch(conn, columns, rows)
+            conn.commit()
+            return result
+        except mysql.connector.Error as err:
+            conn.rollback()
+            if err.errno not in RETRYABLE_ERRORS or attempt == MAX_RETRIES - 1:
+                raise
+            time.sleep(0.05 * (2 ** attempt))
+
+
+def _reject_writer(path, columns):
+    f = open(path, 'w', newline='', encoding='utf-8')
+    writer = csv.writer(f)
+    writer.writerow(columns + ['reject_reason'])
+    return f, writer
+
+
+def ingest(row_chunks, columns, connect, workers=WORKERS, batch_size=BATCH_SIZE, reject_path=None):
+    """
+    row_chunks: iterable of lists of tuples (in `columns` order), e.g. one per parsed file chunk.
+    connect: callable returning a new DB connection (one per worker).
+    Returns {'inserted', 'updated', 'rejected', 'seconds', 'rows_per_sec'}.
+    """
+    start = time.time()
+    style_i = columns.index('style_no')
+    stats = {'inserted': 0, 'updated': 0, 'rejected': 0}
+    stats_lock = threading.Lock()
+    errors = []
+    queues = [queue.Queue(maxsize=4) for _ in range(workers)]
+
+    def worker(q):
+        conn = None
+        try:
+            conn = connect()
+            while True:
+                rows = q.get()
+                if rows is None:
+                    return
+                for i in range(0, len(rows), batch_size):
+                    inserted, updated = write_with_retry(conn, columns, rows[i:i + batch_size])
+                    with stats_lock:
+                        stats['inserted'] += inserted
+                        stats['updated'] += updated
+        except Exception as e:
+            errors.append(e)
+            # Keep draining so the reader never blocks on a full queue
+            while q.get() is not None:
+                pass
+        finally:
+            if conn is not None:
+                conn.close()
+
+    threads = [threading.Thread(target=worker, args=(q,), name=f"ingest-writer-{n}") for n, q in enumerate(queues)]
+    for t in threads:
+        t.start()
+
+    reject_file = reject_csv = None
+    try:
+        for chunk in row_chunks:
+            if errors:
+                break
+            valid, rejected = validate(columns, chunk)
+            if rejected:
+                if reject_csv is None:
+                    reject_file, reject_csv = _reject_writer(reject_path or 'rejected_rows.csv', columns)
+                for row, reason in rejected:
+                    reject_csv.writerow(list(row) + [reason])
+                stats['rejected'] += len(rejected)
+
+            parts = [[] for _ in range(workers)]
+            for row in valid:
+                parts[zlib.crc32(str(row[style_i]).rstrip().lower().encode()) % workers].append(row)
+            for q, part in zip(queues, parts):
+                if part:
+                    q.put(part)
+    finally:
+        for q in queues:
+            q.put(None)
+        for t in threads:
+            t.join()
+        if reject_file:
+            reject_file.close()
+
+    if errors:
+        raise errors[0]
+
+    stats['seconds'] = time.time() - start
+    total = stats['inserted'] + stats['updated']
+    stats['rows_per_sec'] = total / stats['seconds'] if stats['seconds'] else 0
+    print(
+        f"Ingested {total} rows ({stats['inserted']} new, {stats['updated']} updated) "
+        f"in {stats['seconds']:.1f}s ({stats['rows_per_sec']:,.0f} rows/sec); {stats['rejected']} rejected"
+        + (f" -> {reject_path or 'rejected_rows.csv'}" if stats['rejected'] else "")
+    )
+    return stats
@@ -0,0 +1,61 @@
+import mysql.connector
+
+import rollup
+import style_progress
+
+# MySQL error for "table doesn't exist"
+ER_NO_SUCH_TABLE = 1146
+
+_warned = set()
+
+# Maintenance that has to follow every batch written to production_data.
+# Ingestion scripts call after_insert() right after cursor.executemany(),
+# before conn.commit(), so derived tables stay in the same transaction.
+
+def after_insert(conn, columns, rows, ids):
+    # ids[n] is the AUTO_INCREMENT id row n was inserted with
+    if not rows:
+        return
+
+    idx = {col: i for i, col in enumerate(columns)}
+
+    def value(row, col):
+        return row[idx[col]] if col in idx else None
+
+    records = [
+        {
+            'id': row_id,
+            'style_no': value(row, 'style_no'),
+            'production_date': value(row, 'production_date'),
+            'day_achieved': value(row, 'day_achieved'),
+            'day_target': value(row, 'day_target')
+        }
+        for row, row_id in zip(rows, ids)
+    ]
+    _maintain('style_progress', 'style_progress.py', style_progress.apply_rows, conn, records)
+    _maintain(rollup.ROLLUP_TABLE, 'rollup.py', rollup.apply_ids, conn, ids)
+
+
+def after_update(conn, columns, rows):
+    # Existing rows were overwritten in place (upserts): recompute the
+    # affected styles and rollup groups instead of folding rows in incrementally
+    if not rows:
+        return
+    style_i, line_i, date_i = (columns.index(col) for col in ('style_no', 'line_no', 'production_date'))
+    _maintain('style_progress', 'style_progress.py', style_progress.refresh_styles, conn,
+              {row[style_i] for row in rows})
+    _maintain(rollup.ROLLUP_TABLE, 'rollup.py', rollup.refresh_keys, conn,
+              {(row[style_i], row[line_i], row[date_i]) for row in rows})
+
+
+def _maintain(table, script, fn, *args):
+    try:
+        fn(*args)
+    except mysql.connector.Error as err:
+        # Older databases may not have the derived table yet; the insert
+        # itself must not fail because of it (rebuild later instead)
+        if err.errno != ER_NO_SUCH_TABLE:
+            raise
+        if table not in _warned:
+            _warned.add(table)
+            print(f"Warning: {table} table missing; run schema.sql then `python {script} --rebuild`.")
@@ -0,0 +1,82 @@
+import re
+
+import numpy as np
+
+# Pure-NumPy scorer for the TF-IDF + LogisticRegression intent pipeline from
+# train_nlp.py. The weights come from export_nlp_model.py (nlp_model.npz), so
+# serving doesn't need scikit-learn installed.
+
+class IntentScorer:
+    def __init__(self, vocabulary, idf, coef, intercept, classes, stop_words,
+                 token_pattern=r"(?u)\b\w\w+\b", ngram_range=(1, 2), lowercase=True,
+                 norm='l2', sublinear_tf=False):
+        self.vocabulary = vocabulary
+        self.idf = idf
+        self.coef_t = np.ascontiguousarray(coef.T)
+        self.intercept = intercept
+        self.classes = classes
+        self.stop_words = stop_words
+        self.token_re = re.compile(token_pattern)
+        self.ngram_range = ngram_range
+        self.lowercase = lowercase
+        self.norm = norm
+        self.sublinear_tf = sublinear_tf
+
+    @classmethod
+    def load(cls, path='nlp_model.npz'):
+        data = np.load(path, allow_pickle=False)
+        terms = data['terms'].tolist()
+        return cls(
+            vocabulary={term: i for i, term in enumerate(terms)},
+            idf=data['idf'],
+            coef=data['coef'],
+            intercept=data['intercept'],
+            classes=data['classes'].tolist(),
+            stop_words=frozenset(data['stop_words'].tolist()),
+            token_pattern=str(data['token_pattern']),
+            ngram_range=tuple(int(n) for n in data['ngram_range']),
+            lowercase=bool(data['lowercase']),
+            norm=str(data['norm']) or None,
+            sublinear_tf=bool(data['sublinear_tf'])
+        )
+
+    def analyze(self, text):
+        # Same steps as TfidfVectorizer's word analyzer:
+        # lowercase -> tokenize -> drop stop words -> n-grams
+        if self.lowercase:
+            text = text.lower()
+        tokens = [t for t in self.token_re.findall(text) if t not in self.stop_words]
+        min_n, max_n = self.ngram_range
+        terms = []
+        for n in range(min_n, max_n + 1):
+            for i in range(len(tokens) - n + 1):
+                terms.append(" ".join(tokens[i:i + n]))
+        return terms
+
+    def transform(self, texts):
+        X = np.zeros((len(texts), len(self.idf)), dtype=np.float64)
+        for row, text in enumerate(texts):
+            for term in self.analyze(text):
+                col = self.vocabulary.get(term)
+                if col is not None:
+                    X[row, col] += 1
+        if self.sublinear_tf:
+            # sklearn: tf -> log(tf) + 1 for every present term (a count of 1 stays 1)
+            nz = X > 0
+            np.log(X, out=X, where=nz)
+            X[nz] += 1
+        X *= self.idf
+        if self.norm == 'l2':
+            norms = np.sqrt((X * X).sum(axis=1, keepdims=True))
+            np.divide(X, norms, out=X, where=norms > 0)
+        elif self.norm == 'l1':
+            norms = np.abs(X).sum(axis=1, keepdims=True)
+            np.divide(X, norms, out=X, where=norms > 0)
+        return X
+
+    def decision_function(self, texts):
+        return self.transform(texts) @ self.coef_t + self.intercept
+
+    def predict(self, texts):
+        scores = self.decision_function(texts)
+        return [self.classes[i] for i in scores.argmax(axis=1)]
@@ -97,6 +97,14 @@ try:
             count += len(batch)
             print(f"Inserted {count} rows...")
             
+        # Per-style running totals used by PredictEngine
+        import style_progress
+        style_progress.rebuild(conn)
+        
+        # Daily aggregates used by QueryInterpreter
+        import rollup
+        rollup.rebuild(conn)
+
         print("Data Import Complete!")
     
     conn.close()
@@ -2,15 +2,24 @@ from fastapi import FastAPI, HTTPException, Body
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-import mysql.connector
+from typing import List
 import joblib
 import os
 import json
+import time
+import asyncio
+import logging
+import logging.handlers
+import queue
+from db_pool import DB_CONFIG, get_pool, DATA_VERSION_QUERY, data_version_from_row
+import async_db
+from starlette.concurrency import run_in_threadpool
+from query_cache import QueryCache
 from query_interpreter import QueryInterpreter
-from summary_engine import SummaryEngine
+from summary_engine import SummaryEngine, GroupStats
 import numpy as np
 from predict_engine import PredictEngine
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse
 
 app = FastAPI()
 
@@ -29,24 +38,51 @@ nlp = None
 summary_engine = None
 predictor = None
 
+# Per-component load timings (ms), reported by /ready
+startup_timings = {}
+startup_state = {"ready": False, "error": None}
+
+def timed_load(name, factory):
+    start = time.perf_counter()
+    obj = factory()
+    startup_timings[name] = round((time.perf_counter() - start) * 1000, 1)
+    return obj
+
 @app.on_event("startup")
 async def startup_event():
     global nlp, summary_engine, predictor
     print("Initializing AI Models...")
-    nlp = QueryInterpreter()
-    summary_engine = SummaryEngine()
-    predictor = PredictEngine()
-    print("AI Models initialized successfully.")
-
-# DB Config
-# DB Config
-DB_CONFIG = {
-    'host': os.getenv('DB_HOST', 'localhost'),
-    'user': os.getenv('DB_USER', 'root'),
-    'password': os.getenv('DB_PASSWORD', ''),
-    'database': os.getenv('DB_NAME', 'garment_db'),
-    'port': int(os.getenv('DB_PORT', 3306))
-}
+    start = time.perf_counter()
+    
+    # LAZY_STARTUP=1: DB-backed dictionaries load on first use / in the background
+    lazy = os.getenv('LAZY_STARTUP', '1') == '1'
+    
+    # Load the artifacts concurrently (joblib/sklearn, ONNX session)
+    loop = asyncio.get_running_loop()
+    try:
+        nlp, summary_engine, predictor = await asyncio.gather(
+            loop.run_in_executor(None, timed_load, 'query_interpreter', lambda: QueryInterpreter(lazy=lazy)),
+            loop.run_in_executor(None, timed_load, 'summary_engine', SummaryEngine),
+            loop.run_in_executor(None, timed_load, 'predict_engine', PredictEngine)
+        )
+    except Exception as e:
+        startup_state["error"] = str(e)
+        raise
+    
+    # Pick up newly ingested styles/dates without a restart
+    nlp.start_background_refresh()
+    start_query_log()
+    
+    startup_timings['total'] = round((time.perf_counter() - start) * 1000, 1)
+    startup_state["ready"] = True
+    print(f"AI Models initialized successfully in {startup_timings['total']} ms.")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if nlp is not None:
+        nlp.stop_background_refresh()
+    stop_query_log()
+    await async_db.close_async_pool()
 
 class QueryRequest(BaseModel):
     text: str
@@ -57,17 +93,151 @@ class PredictRequest(BaseModel):
     line_no: int = 0
     fabric_gsm: int = 0
 
+class PredictBatchRequest(BaseModel):
+    style_nos: List[str]
+
+# Upper bound on styles per /predict/batch call
+MAX_BATCH_STYLES = int(os.getenv('MAX_BATCH_STYLES', 1000))
+
 def get_db_connection():
-    return mysql.connector.connect(**DB_CONFIG)
+    # Pooled connection; close() returns it to the shared pool
+    return get_pool(DB_CONFIG).get_connection()
+
+# Optional JSONL log of executed /ask queries, replayed by index_advisor.py
+QUERY_LOG_PATH = os.getenv('QUERY_LOG_PATH')
+
+# Lines are queued by the request and appended by one listener thread, so /ask never waits on disk
+query_logger = logging.getLogger('query_log')
+query_logger.propagate = False
+query_log_listener = None
+
+def start_query_log():
+    global query_log_listener
+    if not QUERY_LOG_PATH or query_log_listener is not None:
+        return
+    try:
+        file_handler = logging.FileHandler(QUERY_LOG_PATH, encoding='utf-8')
+    except OSError as e:
+        print(f"Warning: could not open query log: {e}")
+        return
+    file_handler.setFormatter(logging.Formatter('%(message)s'))
+    log_queue = queue.SimpleQueue()
+    query_logger.setLevel(logging.INFO)
+    query_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    query_log_listener = logging.handlers.QueueListener(log_queue, file_handler)
+    query_log_listener.start()
+
+def stop_query_log():
+    # Flushes queued lines
+    if query_log_listener is not None:
+        query_log_listener.stop()
+
+def log_query(sql, params, duration_ms):
+    if query_log_listener is None:
+        return
+    query_logger.info(json.dumps({
+        "ts": time.time(), "sql": sql, "params": params, "duration_ms": duration_ms
+    }, default=str))
+
+# Cache of /ask responses keyed on the interpreted (sql, params)
+query_cache = QueryCache()
+
+async def refresh_cache_version():
+    # Poll MAX(id)/MAX(production_date) at most every QUERY_CACHE_VERSION_CHECK seconds
+    # Claimed before the await: requests arriving during the poll don't start their own
+    if not query_cache.claim_version_check():
+        return
+    try:
+        row = await async_db.fetch_one(DATA_VERSION_QUERY, dictionary=False)
+        query_cache.update_version(data_version_from_row(row))
+    except Exception as e:
+        print(f"Warning: could not check data version for cache: {e}")
 
 @app.get("/")
 def read_root():
     return FileResponse('frontend/index.html')
 
+# Rows shown in the response table
+TABLE_ROWS = 50
+
+# ASK_STREAMING=1: iterate /ask results on a server-side cursor instead of fetchall()
+ASK_STREAMING = os.getenv('ASK_STREAMING', '1') == '1'
+
+class SqlResponseBuilder:
+    # Consumes result rows once: summary stats and chart aggregates are
+    # updated per row and only the first TABLE_ROWS rows are kept, so memory
+    # doesn't grow with the number of matching rows
+    def __init__(self, interpretation, sql):
+        self.metric = interpretation['parsed_query']['metric']
+        self.sql = sql
+        self.summary = summary_engine.start_summary(self.metric, interpretation['parsed_query'])
+        self.table_data = []
+        self.chart_mode = None
+        self.chart_groups = GroupStats()
+
+    def add(self, r):
+        # 3. Generate Insight
+        self.summary.add(r)
+
+        # 4. Chart aggregates (shape decided by the first row)
+        if self.chart_mode is None:
+            if self.metric == 'efficiency' and 'production_date' in r:
+                self.chart_mode = 'efficiency_by_date'
+            elif 'buyer_name' in r:
+                self.chart_mode = 'production_by_buyer'
+            else:
+                self.chart_mode = ''
+        if self.chart_mode == 'efficiency_by_date':
+            if r.get('efficiency') is not None:
+                self.chart_groups.add(str(r['production_date']), r['efficiency'])
+        elif self.chart_mode == 'production_by_buyer':
+            self.chart_groups.add(r['buyer_name'], r.get('day_achieved', 0) or 0)
+
+        # Table rows
+        if len(self.table_data) < TABLE_ROWS:
+            self.table_data.append({k: ("" if v is None else v) for k, v in r.items()})
+
+    def result(self):
+        summary_res = self.summary.result()
+
+        chart_data = {}
+        groups = self.chart_groups.groups
+        if self.chart_mode == 'efficiency_by_date':
+            chart_data = {
+                'labels': list(groups.keys()),
+                'values': [stats.mean() for stats in groups.values()]
+            }
+        elif self.chart_mode == 'production_by_buyer':
+            chart_data = {
+                'labels': list(groups.keys()),
+                'values': [stats.sum for stats in groups.values()]
+            }
+
+        return {
+            "summary_text": summary_res['summary'],
+            "recommendations": summary_res['recommendations'],
+            "table_data": self.table_data,
+            "chart_data": chart_data,
+            "sql_debug": self.sql
+        }
+
+def build_sql_response(rows, interpretation, sql):
+    builder = SqlResponseBuilder(interpretation, sql)
+    for r in rows:
+        builder.add(r)
+    return builder.result()
+
+async def stream_sql_response(sql, params, interpretation):
+    builder = SqlResponseBuilder(interpretation, sql)
+    async for r in async_db.iter_rows(sql, params):
+        builder.add(r)
+    return builder.result()
+
 @app.post("/ask")
-def process_query(request: QueryRequest):
+async def process_query(request: QueryRequest):
     try:
-        interpretation = nlp.interpret(request.text)
+        # Interpretation is CPU work (and may load dictionaries on first use) -> worker thread
+        interpretation = await run_in_threadpool(nlp.interpret, request.text)
         
         # Check for Prediction Intent
         if interpretation.get('type') == 'prediction':
@@ -76,7 +246,7 @@ def process_query(request: QueryRequest):
                 return {"summary_text": "I understood you want a prediction, but I couldn't identify the Style Number (e.g. ST150).", "table_data": [], "chart_data": {}}
             
             # Call Prediction Engine
-            pred_result = predictor.predict_order(style)
+            pred_result = await predictor.predict_order_async(style)
             if "error" in pred_result:
                  return {"summary_text": f"Error: {pred_result['error']}", "table_data": [], "chart_data": {}}
             
@@ -97,7 +267,7 @@ def process_query(request: QueryRequest):
 
         # Handling Risk Overview (Vague "Will we finish?" queries)
         if interpretation.get('type') == 'risk_overview':
-             report = predictor.get_active_risk_report()
+             report = await run_in_threadpool(predictor.get_active_risk_report)
              if "error" in report:
                   return {"summary_text": f"Error generating risk report: {report['error']}"}
              
@@ -118,66 +288,103 @@ def process_query(request: QueryRequest):
         sql = interpretation['sql']
         params = interpretation['params']
         
-        # 2. Execute SQL
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute(sql, params)
-        rows = cursor.fetchall()
-        conn.close()
+        # Repeat questions are served from cache until new rows are ingested
+        cache_key = query_cache.make_key(sql, params)
+        await refresh_cache_version()
+        cache_version = query_cache.version
+        cached = query_cache.get(cache_key)
+        if cached is not None:
+            return cached
         
-        # 3. Generate Insight
-        metric = interpretation['parsed_query']['metric']
-        context = interpretation['parsed_query']
-        
-        summary_res = summary_engine.generate_summary(rows, metric, context)
-        
-        # 4. Format Data for Charts
-        chart_data = {}
-        if rows:
-            if metric == 'efficiency' and 'production_date' in rows[0]:
-                 chart_data = {
-                     'labels': [str(r['production_date']) for r in rows],
-                     'values': [r['efficiency'] for r in rows]
-                 }
-            elif 'buyer_name' in rows[0]:
-                # Aggregate for chart if too many rows (Simple Python Aggregation)
-                agg = {}
-                for r in rows:
-                    bn = r['buyer_name']
-                    amount = r.get('day_achieved', 0) or 0
-                    agg[bn] = agg.get(bn, 0) + amount
-                
-                chart_data = {
-                     'labels': list(agg.keys()),
-                     'values': list(agg.values())
-                }
-             
-        # Convert df to records for Table
-        # rows is already a list of dicts
-        for r in rows:
-            for k, v in r.items():
-                if v is None: r[k] = ""
-        
-        table_data = rows[:50]
-        
-        return {
-            "summary_text": summary_res['summary'],
-            "recommendations": summary_res['recommendations'],
-            "table_data": table_data,
-            "chart_data": chart_data,
-            "sql_debug": sql
-        }
+        # 2-4. Execute SQL (non-blocking driver), then insight + chart/table formatting
+        start = time.perf_counter()
+        if ASK_STREAMING:
+            # Single pass over a server-side cursor; constant memory for broad queries
+            response = await stream_sql_response(sql, params, interpretation)
+        else:
+            rows = await async_db.fetch_all(sql, params)
+            response = await run_in_threadpool(build_sql_response, rows, interpretation, sql)
+        log_query(sql, params, round((time.perf_counter() - start) * 1000, 1))
+        query_cache.put(cache_key, response, cache_version)
+        return response
         
     except Exception as e:
         print(e)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/health")
+def health():
+    # Liveness: the process is up and serving
+    return {"status": "ok"}
+
+@app.get("/ready")
+def ready():
+    # Readiness: every component loaded (the interpreter's DB dictionaries too);
+    # 503 until then, with per-component state and load timings
+    components = {
+        "query_interpreter": {
+            "ready": nlp is not None and getattr(nlp, '_loaded', False) and getattr(nlp, 'matcher_loaded', False),
+            "ml_enabled": getattr(nlp, 'ml_enabled', False),
+            "dictionaries_loaded": getattr(nlp, '_loaded', False),
+            "matcher_loaded": getattr(nlp, 'matcher_loaded', False),
+            "timings_ms": getattr(nlp, 'load_timings', {})
+        },
+        "summary_engine": {"ready": summary_engine is not None},
+        "predict_engine": {"ready": getattr(predictor, 'loaded', False)}
+    }
+    is_ready = startup_state["ready"] and all(c["ready"] for c in components.values())
+    body = {
+        "ready": is_ready,
+        "error": startup_state["error"],
+        "startup_timings_ms": startup_timings,
+        "components": components
+    }
+    return JSONResponse(content=body, status_code=200 if is_ready else 503)
+
+@app.get("/metrics")
+def get_metrics():
+    return {
+        "db_pool": get_pool(DB_CONFIG).stats(),
+        "async_db": async_db.stats(),
+        "query_cache": query_cache.stats(),
+        "onnx": predictor.runner.stats() if getattr(predictor, 'loaded', False) else None,
+        "predict_batching": predictor.batcher.stats() if getattr(predictor, 'batcher', None) else None
+    }
+
 @app.post("/predict")
-def predict_completion(req: PredictRequest):
+async def predict_completion(req: PredictRequest):
     # Direct API endpoint using the same engine
-    result = predictor.predict_order(req.style_no)
+    result = await predictor.predict_order_async(req.style_no)
     return result
 
+@app.post("/predict/batch")
+async def predict_completion_batch(req: PredictBatchRequest):
+    # Deduplicate (case-insensitive, like MySQL) while keeping request order
+    unique = {}
+    for s in req.style_nos:
+        if s.strip():
+            unique.setdefault(s.strip().lower(), s.strip())
+    style_nos = list(unique.values())
+    if not style_nos:
+        raise HTTPException(status_code=400, detail="style_nos must contain at least one style number.")
+    if len(style_nos) > MAX_BATCH_STYLES:
+        raise HTTPException(status_code=400, detail=f"Too many styles ({len(style_nos)}); max is {MAX_BATCH_STYLES}.")
+
+    try:
+        # One bulk DB fetch + one batched ONNX run for the whole list
+        results = await predictor.predict_batch_async(style_nos)
+    except Exception as e:
+        print(e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+    predictions = [r for r in results if "error" not in r]
+    errors = [r for r in results if "error" in r]
+    return {
+        "count": len(style_nos),
+        "predictions": predictions,
+        "errors": errors
+    }
+
 # Mount static files for UI
 if not os.path.exists("frontend"):
     os.makedirs("frontend")
@@ -0,0 +1,22 @@
+-- Composite indexes for the query shapes QueryInterpreter emits:
+--   WHERE production_date BETWEEN ? AND ? [AND <buyer_name|style_no|line_no|fabric_type> = ?]
+-- Equality column first, then the date range, so both predicates narrow the scan.
+-- The single-column idx_buyer/idx_style/idx_line are left-prefixes of these and are dropped;
+-- idx_date is replaced by a covering index for date-only aggregates (no row lookups).
+-- Check the result against real traffic with `python index_advisor.py`.
+--
+-- Apply once: mysql garment_db < migrations/001_composite_indexes.sql
+
+ALTER TABLE production_data
+    ADD INDEX idx_buyer_date (buyer_name, production_date),
+    ADD INDEX idx_style_date (style_no, production_date),
+    ADD INDEX idx_line_date (line_no, production_date),
+    ADD INDEX idx_fabric_date (fabric_type, production_date),
+    ADD INDEX idx_date_measures (production_date, day_achieved, day_target, rejection, planned_fabric_meters, actual_fabric_used),
+    DROP INDEX idx_buyer,
+    DROP INDEX idx_style,
+    DROP INDEX idx_line,
+    DROP INDEX idx_date;
+
+-- production_daily_rollup's indexes are created by rollup.py: `python rollup.py --rebuild`
+-- adds any that are missing on an existing table.
@@ -0,0 +1,22 @@
+-- Natural key for production rows so re-ingesting an export updates rows
+-- instead of duplicating them (see ingest_engine.py).
+-- NULL order_no would never collide in a unique index, so it is normalized to ''.
+-- Duplicates already in the table are removed first, keeping the oldest row.
+--
+-- Apply once: mysql garment_db < migrations/002_natural_key.sql
+-- Then rebuild the derived tables:
+--   python style_progress.py --rebuild && python rollup.py --rebuild
+
+UPDATE production_data SET order_no = '' WHERE order_no IS NULL;
+
+DELETE newer FROM production_data newer
+JOIN production_data older
+  ON older.style_no = newer.style_no
+ AND older.line_no = newer.line_no
+ AND older.production_date = newer.production_date
+ AND older.order_no = newer.order_no
+ AND older.id < newer.id;
+
+ALTER TABLE production_data
+    MODIFY order_no VARCHAR(50) NOT NULL DEFAULT '',
+    ADD UNIQUE KEY uq_natural_key (style_no, line_no, production_date, order_no);
@@ -0,0 +1,232 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from sklearn.ensemble import ExtraTreesRegressor, HistGradientBoostingRegressor, RandomForestRegressor
+from sklearn.linear_model import Ridge
+from sklearn.metrics import mean_absolute_error, r2_score
+from sklearn.tree import DecisionTreeRegressor
+
+import train_model
+
+# Model selection for the order completion model.
+#
+# Candidates are scored on time-ordered folds: each fold trains on every row
+# before a date cutoff and tests on the next block of days, the way the model
+# is used (fit on history, predict the days after). A random split lets a
+# style's later days leak into training.
+# Next to MAE/R2 each candidate gets what matters for serving it from
+# PredictEngine: ONNX file size and onnxruntime latency for one row and for
+# a risk-report sized batch. Fits run in a process pool; latency is measured
+# afterwards, one model at a time, so the timings don't compete with training.
+
+SPLITS = 4
+LATENCY_RUNS = 200
+BATCH_ROWS = 1000
+RESULTS_PATH = os.getenv('MODEL_SELECTION_PATH', 'model_selection.json')
+
+# name -> (estimator, params); forests use n_jobs=1, the pool provides the parallelism
+CANDIDATES = {
+    'rf_100': (RandomForestRegressor, {'n_estimators': 100, 'random_state': 42, 'n_jobs': 1}),  # current model
+    'rf_50_d16': (RandomForestRegressor, {'n_estimators': 50, 'max_depth': 16, 'random_state': 42, 'n_jobs': 1}),
+    'rf_25_d12': (RandomForestRegressor, {'n_estimators': 25, 'max_depth': 12, 'random_state': 42, 'n_jobs': 1}),
+    'extra_50_d16': (ExtraTreesRegressor, {'n_estimators': 50, 'max_depth': 16, 'random_state': 42, 'n_jobs': 1}),
+    'hgb_200': (HistGradientBoostingRegressor, {'max_iter': 200, 'random_state': 42}),
+    'hgb_100_l15': (HistGradientBoostingRegressor, {'max_iter': 100, 'max_leaf_nodes': 15, 'random_state': 42}),
+    'tree_d10': (DecisionTreeRegressor, {'max_depth': 10, 'random_state': 42}),
+    'ridge': (Ridge, {'alpha': 1.0})
+}
+
+# Set in each pool worker by _init_worker (sent once per process, not per task)
+_DATA = {}
+
+
+def time_splits(dates, n_splits=SPLITS):
+    """
+    Expanding-window folds over production dates: the distinct days are cut
+    into n_splits + 1 blocks; fold i trains on blocks 0..i and tests on block i + 1.
+    Returns [(train_idx, test_idx)].
+    """
+    days = np.unique(dates)
+    if len(days) < n_splits + 1:
+        raise ValueError(f"Need at least {n_splits + 1} distinct production dates, got {len(days)}")
+    cuts = [days[len(days) * k // (n_splits + 1)] for k in range(1, n_splits + 1)]
+    folds = []
+    for i, cut in enumerate(cuts):
+        train = np.flatnonzero(dates < cut)
+        test_mask = dates >= cut
+        if i + 1 < len(cuts):
+            test_mask &= dates < cuts[i + 1]
+        folds.append((train, np.flatnonzero(test_mask)))
+    return folds
+
+
+def to_onnx(model, n_features):
+    from skl2onnx import convert_sklearn
+    from skl2onnx.common.data_types import FloatTensorType
+    onx = convert_sklearn(model, initial_types=[('float_input', FloatTensorType([None, n_features]))])
+    return onx.SerializeToString()
+
+
+def _init_worker(X, y, folds):
+    _DATA.update(X=X, y=y, folds=folds)
+
+
+def evaluate(name):
+    # Runs in a pool worker: fit/score every fold, export the last fold's model to ONNX
+    estimator, params = CANDIDATES[name]
+    X, y, folds = _DATA['X'], _DATA['y'], _DATA['folds']
+    result = {'name': name, 'model': estimator.__name__, 'params': params, 'mae': [], 'r2': [], 'fit_seconds': []}
+    for train, test in folds:
+        model = estimator(**params)
+        start = time.perf_counter()
+        model.fit(X[train], y[train])
+        result['fit_seconds'].append(time.perf_counter() - start)
+        preds = model.predict(X[test])
+        result['mae'].append(float(mean_absolute_error(y[test], preds)))
+        result['r2'].append(float(r2_score(y[test], preds)))
+
+    try:
+        result['onnx'] = to_onnx(model, X.shape[1])
+        # The ONNX graph must give the same answers as the sklearn model
+        result['sample'] = X[test[:BATCH_ROWS]]
+        result['expected'] = model.predict(result['sample'])
+    except Exception as e:
+        result['onnx_error'] = str(e).splitlines()[0][:200]
+    return result
+
+
+def measure_latency(onnx_bytes, sample):
+    import onnxruntime as ort
+    from onnx_runner import session_options
+    # Same session options PredictEngine serves with (threads, spinning, ORT_* env)
+    sess = ort.InferenceSession(onnx_bytes, session_options(), providers=['CPUExecutionProvider'])
+    input_name = sess.get_inputs()[0].name
+    output_name = sess.get_outputs()[0].name
+
+    def timed(batch):
+        sess.run([output_name], {input_name: batch})  # warm-up
+        times = []
+        for _ in range(LATENCY_RUNS):
+            start = time.perf_counter()
+            sess.run([output_name], {input_name: batch})
+            times.append((time.perf_counter() - start) * 1000)
+        return np.percentile(times, [50, 99])
+
+    batch = np.ascontiguousarray(sample, dtype=np.float32)
+    single_p50, single_p99 = timed(batch[:1])
+    batch_p50, batch_p99 = timed(batch)
+    predicted = sess.run([output_name], {input_name: batch})[0].reshape(-1)
+    return {
+        'single_p50_ms': single_p50, 'single_p99_ms': single_p99,
+        'batch_p50_ms': batch_p50, 'batch_p99_ms': batch_p99, 'batch_rows': len(batch),
+        'predicted': predicted
+    }
+
+
+def summarize(result):
+    # Raw fold lists -> reported metrics (JSON-friendly)
+    row = {
+        'name': result['name'], 'model': result['model'], 'params': result['params'],
+        'mae': float(np.mean(result['mae'])), 'mae_folds': result['mae'],
+        'r2': float(np.mean(result['r2'])), 'r2_folds': result['r2'],
+        'fit_seconds': float(np.mean(result['fit_seconds']))
+    }
+    if 'onnx' not in result:
+        row['onnx_error'] = result.get('onnx_error')
+        return row
+    try:
+        latency = measure_latency(result['onnx'], result['sample'])
+    except Exception as e:
+        row['onnx_error'] = str(e).splitlines()[0][:200]
+        return row
+    row['onnx_kb'] = len(result['onnx']) / 1024
+    row['onnx_max_diff'] = float(np.max(np.abs(latency.pop('predicted') - result['expected'])))
+    row.update({k: float(v) for k, v in latency.items()})
+    return row
+
+
+def pick(rows, tolerance=0.05):
+    # Fastest model within `tolerance` of the best MAE. Ranked on batch latency:
+    # single-row calls are mostly fixed session overhead, the same for every model
+    best_mae = min(r['mae'] for r in rows)
+    eligible = [r for r in rows if r['mae'] <= best_mae * (1 + tolerance) and 'batch_p50_ms' in r]
+    if not eligible:
+        return min(rows, key=lambda r: r['mae'])
+    return min(eligible, key=lambda r: r['batch_p50_ms'])
+
+
+def print_table(rows, chosen):
+    print(f"\n{'candidate':<14} {'MAE':>8} {'R2':>7} {'fit s':>7} {'ONNX KB':>9} {'1-row p50/p99 ms':>17} {f'{BATCH_ROWS}-row p50 ms':>15}")
+    for r in sorted(rows, key=lambda r: r['mae']):
+        if 'single_p50_ms' in r:
+            serving = f"{r['onnx_kb']:>9.1f} {r['single_p50_ms']:>8.3f}/{r['single_p99_ms']:<8.3f} {r['batch_p50_ms']:>15.2f}"
+        else:
+            serving = f"  ONNX unavailable: {r.get('onnx_error')}"
+        mark = ' <-' if r is chosen else ''
+        print(f"{r['name']:<14} {r['mae']:>8.2f} {r['r2']:>7.4f} {r['fit_seconds']:>7.1f} {serving}{mark}")
+
+
+def run(names=None, workers=None, n_splits=SPLITS, sample=None, full_scan=False, tolerance=0.05, save=False):
+    data = train_model.load_training_data(full_scan)
+    if data is None:
+        print("No training rows.")
+        return None
+    X, y, dates, le_style, le_buyer = data
+
+    if sample and sample < len(X):
+        # Uniform subsample, time order kept
+        keep = np.sort(np.random.default_rng(42).choice(len(X), sample, replace=False))
+        X, y, dates = X[keep], y[keep], dates[keep]
+
+    names = names or list(CANDIDATES)
+    folds = time_splits(dates, n_splits)
+    workers = workers or os.cpu_count() or 1
+    print(f"Evaluating {len(names)} candidates on {len(X)} rows, {len(folds)} time-ordered folds, {workers} workers...")
+
+    start = time.time()
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(X, y, folds)) as pool:
+        for result in pool.map(evaluate, names):
+            print(f"  {result['name']}: MAE {np.mean(result['mae']):.2f}")
+            results.append(result)
+    print(f"Fitted in {time.time() - start:.1f}s; measuring ONNX latency...")
+
+    rows = [summarize(r) for r in results]
+    chosen = pick(rows, tolerance)
+    print_table(rows, chosen)
+    print(f"\nRecommended: {chosen['name']} (fastest within {tolerance:.0%} of the best MAE)")
+
+    with open(RESULTS_PATH, 'w') as f:
+        json.dump({'rows': len(X), 'folds': len(folds), 'chosen': chosen['name'], 'results': rows}, f, indent=2)
+    print(f"Results saved to '{RESULTS_PATH}'")
+
+    if save:
+        # Refit the chosen candidate on every row, in the layout convert_to_onnx.py reads
+        estimator, params = CANDIDATES[chosen['name']]
+        model = estimator(**params)
+        model.fit(X, y)
+        train_model.save_artifacts(model, le_style, le_buyer)
+        print("Run convert_to_onnx.py to serve it.")
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare candidate completion models on time-ordered folds.")
+    parser.add_argument('--candidates', default=None, help=f"Comma-separated subset of: {', '.join(CANDIDATES)}")
+    parser.add_argument('--workers', type=int, default=None, help="Processes (default: CPU count)")
+    parser.add_argument('--splits', type=int, default=SPLITS, help="Time-ordered folds")
+    parser.add_argument('--sample', type=int, default=None, help="Evaluate on a uniform sample of N rows")
+    parser.add_argument('--tolerance', type=float, default=0.05, help="MAE slack when preferring faster models")
+    parser.add_argument('--full-scan', action='store_true', help="Engineer features from a full table read")
+    parser.add_argument('--save', action='store_true', help="Refit the recommended model and save its artifacts")
+    args = parser.parse_args()
+
+    run(
+        names=args.candidates.split(',') if args.candidates else None,
+        workers=args.workers, n_splits=args.splits, sample=args.sample,
+        full_scan=args.full_scan, tolerance=args.tolerance, save=args.save
+    )
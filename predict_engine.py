@@ -1,129 +1,172 @@
 import joblib
 import numpy as np
-import mysql.connector
 import os
-
-import onnxruntime as ort
-import joblib
+import asyncio
+from db_pool import DB_CONFIG, get_pool
+import async_db
+import style_progress
+from features import (
+    build_feature_matrix, chunked, combine_snapshots, cumulative_totals_query,
+    group_recent_snapshots, load_snapshots, recent_snapshots_query
+)
 
 import json
-import onnxruntime as ort
+from onnx_runner import OnnxRunner
+import batch_scheduler
+
+# MySQL error for "table doesn't exist"
+ER_NO_SUCH_TABLE = 1146
+
+
+def is_missing_table(err):
+    # mysql.connector sets errno; aiomysql (PyMySQL) passes the code as args[0]
+    code = getattr(err, 'errno', None) or (err.args[0] if err.args else None)
+    return code == ER_NO_SUCH_TABLE
 
 class PredictEngine:
-    def __init__(self, model_path='model_order_completion.onnx', encoder_path='encoders.json'):
+    def __init__(self, model_path=os.getenv('ONNX_MODEL_PATH', 'model_order_completion.onnx'), encoder_path='encoders.json'):
         try:
-            # Load ONNX Model
-            self.sess = ort.InferenceSession(model_path)
-            
+            # Load ONNX Model (tuned session, cached I/O metadata, see onnx_runner.py)
+            self.runner = OnnxRunner(model_path)
+
             # Load Encoders
             with open(encoder_path, 'r') as f:
                 self.encoders = json.load(f)
-                
+
             self.loaded = True
         except Exception as e:
             print(f"Error loading ONNX model/encoders: {e}")
             self.loaded = False
-            
-        self.db_config = {
-            'host': os.getenv('DB_HOST', 'localhost'),
-            'user': os.getenv('DB_USER', 'root'),
-            'password': os.getenv('DB_PASSWORD', ''),
-            'database': os.getenv('DB_NAME', 'garment_db'),
-            'port': int(os.getenv('DB_PORT', 3306))
-        }
+
+        self.db_config = DB_CONFIG
+
+        # Read running totals from style_progress (disabled automatically if the table is missing)
+        self.use_progress = os.getenv('USE_STYLE_PROGRESS', '1') == '1'
+
+        # How many recent rows define the "active" styles for the risk report
+        self.active_window = int(os.getenv('RISK_REPORT_WINDOW', 1000))
+
+        # Concurrent single-style predictions share one DB fetch + ONNX run (see batch_scheduler.py)
+        self.batcher = batch_scheduler.MicroBatcher(self.predict_batch_async) if batch_scheduler.BATCHING_ENABLED else None
+
+    def get_db_connection(self):
+        return get_pool(self.db_config).get_connection()
 
     def get_latest_data(self, style_no):
-        conn = mysql.connector.connect(**self.db_config)
-        cursor = conn.cursor(dictionary=True)
-        # Getting the latest snapshot of the style
-        query = """
-        SELECT * FROM production_data 
-        WHERE style_no = %s 
-        ORDER BY production_date DESC LIMIT 1
-        """
-        cursor.execute(query, (style_no,))
-        row = cursor.fetchone()
-        
-        # We also need cumulative sum to calculate remaining qty correctly
-        agg_query = """
-        SELECT SUM(day_achieved) as total_produced 
-        FROM production_data WHERE style_no = %s
-        """
-        cursor.execute(agg_query, (style_no,))
-        res = cursor.fetchone()
-        total_produced = res['total_produced'] if res and res['total_produced'] else 0
-        
-        conn.close()
+        row, total_produced, _ = self.get_latest_data_batch([style_no]).get(style_no.lower(), (None, 0, None))
         return row, total_produced
 
-    def predict_order(self, style_no):
-        if not self.loaded:
-            return {"error": "Model not loaded"}
+    def get_latest_data_batch(self, style_nos):
+        # Latest snapshot, cumulative total and efficiency trend for many styles
+        # Returns {style_no.lower(): (row, total_produced, efficiency_trend)} for styles that exist
+        # (keys are lowercased because MySQL matches style_no case-insensitively)
+        snapshots = {}
+        if not style_nos:
+            return snapshots
+
+        conn = self.get_db_connection()
+        try:
+            # 1. O(1) path: maintained running totals + latest snapshot by primary key
+            snapshots.update(self.get_progress_snapshots(conn, style_nos))
+
+            # 2. Styles not in style_progress yet: windowed query over their
+            #    last 7 snapshots + grouped SUM over history
+            missing = [s for s in style_nos if s.lower() not in snapshots]
+            if missing:
+                snapshots.update(load_snapshots(conn, missing))
+        finally:
+            conn.close()
+        return snapshots
+
+    def get_progress_snapshots(self, conn, style_nos):
+        snapshots = {}
+        if not self.use_progress:
+            return snapshots
+        try:
+            progress = style_progress.fetch_progress(conn, style_nos)
+        except Exception as e:
+            # Table not created yet -> fall back to history scans from now on;
+            # anything else (lost connection, timeout) is the caller's error
+            if not is_missing_table(e):
+                raise
+            print(f"Warning: style_progress unavailable, using history scans: {e}")
+            self.use_progress = False
+            return snapshots
+        if not progress:
+            return snapshots
+
+        cursor = conn.cursor(dictionary=True)
+        latest_rows = []
+        for sql, params in self.latest_rows_queries(progress):
+            cursor.execute(sql, params)
+            latest_rows.extend(cursor.fetchall())
+        return self.combine_progress(progress, latest_rows)
+
+    def latest_rows_queries(self, progress):
+        # Latest snapshot rows by primary key
+        ids = [p['latest_id'] for p in progress.values() if p['latest_id']]
+        for chunk in chunked(ids):
+            placeholders = ', '.join(['%s'] * len(chunk))
+            yield f"SELECT * FROM production_data WHERE id IN ({placeholders})", chunk
+
+    def combine_progress(self, progress, latest_rows):
+        snapshots = {}
+        for row in latest_rows:
+            key = row['style_no'].lower()
+            p = progress.get(key)
+            if p and p['latest_id'] == row['id']:
+                snapshots[key] = (row, p['cumulative_achieved'] or 0, p['efficiency_7d'])
+        return snapshots
+
+    async def get_latest_data_batch_async(self, style_nos):
+        # Same lookups as get_latest_data_batch, awaited on the async DB driver
+        snapshots = {}
+        if not style_nos:
+            return snapshots
 
-        row, total_produced = self.get_latest_data(style_no)
-        
-        if not row:
-            return {"error": f"Style {style_no} not found in history."}
-            
-        # Prepare Features (Mirroring train_model.py)
-        # 1. Encoders (Handle unseen labels gracefully)
-        style_enc = self.encoders['style_map'].get(str(row['style_no']), 0)
-        buyer_enc = self.encoders['buyer_map'].get(str(row['buyer_name']), 0)
-            
-        # 2. Calculated features
-        remaining = max(0, row['order_quantity'] - total_produced)
-        daily_eff = (row['day_achieved'] / row['day_target']) if row['day_target'] else 0
-        
-        # Approximating Trend (Using current daily eff as proxy)
-        eff_trend = daily_eff 
-        
-        fabric_var = 0
-        if row['planned_fabric_meters']:
-            fabric_var = (row['actual_fabric_used'] - row['planned_fabric_meters']) / row['planned_fabric_meters']
-            
-        hour_output = sum([row[f'hour_{i}'] for i in range(1, 9)])
-        
-        # Build feature list explicitly in the correct order for the model
-        # Feature order: ['style_encoded', 'buyer_encoded', 'order_quantity', 'cumulative_achieved', 'remaining_qty', 'daily_efficiency', 'efficiency_trend', 'fabric_variance', 'hour_output', 'rejection', 'line_no']
-        
-        input_data = [
-            [
-                float(style_enc),
-                float(buyer_enc),
-                float(row['order_quantity']),
-                float(total_produced),
-                float(remaining),
-                float(daily_eff),
-                float(eff_trend),
-                float(fabric_var),
-                float(hour_output),
-                float(row['rejection']),
-                float(row['line_no'])
-            ]
-        ]
-        
-        # ONNX Inference
-        input_name = self.sess.get_inputs()[0].name
-        label_name = self.sess.get_outputs()[0].name
-        
-        # We need numpy for ONNX runtime usually, or it might accept lists?
-        # Standard ORT requires numpy arrays.
-        # Luckily we kept numpy in requirements.txt (it is smaller than scipy)
-        import numpy as np
-        input_arr = np.array(input_data, dtype=np.float32)
-        
-        pred_onx = self.sess.run([label_name], {input_name: input_arr})[0]
-        predicted_rate = pred_onx[0][0] # [[value]]
-        
+        if self.use_progress:
+            try:
+                progress = {}
+                for chunk in chunked(style_nos):
+                    for row in await async_db.fetch_all(*style_progress.progress_query(chunk)):
+                        progress[row['style_no'].lower()] = row
+                latest_rows = []
+                for sql, params in self.latest_rows_queries(progress):
+                    latest_rows.extend(await async_db.fetch_all(sql, params))
+                snapshots.update(self.combine_progress(progress, latest_rows))
+            except Exception as e:
+                if not is_missing_table(e):
+                    raise
+                print(f"Warning: style_progress unavailable, using history scans: {e}")
+                self.use_progress = False
+
+        missing = [s for s in style_nos if s.lower() not in snapshots]
+        if missing:
+            recent = {}
+            for chunk in chunked(missing):
+                group_recent_snapshots(await async_db.fetch_all(*recent_snapshots_query(chunk)), recent)
+            if recent:
+                totals = {}
+                for chunk in chunked(list(recent.keys())):
+                    for r in await async_db.fetch_all(*cumulative_totals_query(chunk)):
+                        totals[r['style_no'].lower()] = r['total_produced'] or 0
+                snapshots.update(combine_snapshots(recent, totals))
+        return snapshots
+
+    def run_model(self, features):
+        # ONNX Inference on a (N, 11) float32 matrix -> (N,) predicted daily rates
+        return self.runner.run(features)
+
+    def format_prediction(self, style_no, remaining, predicted_rate, eff_trend):
         if predicted_rate <= 10: predicted_rate = 10 # Safety floor
-        
+
         days_left = remaining / predicted_rate
-        
+
         # Risk Logic
         risk = "Low"
         if days_left > 7: risk = "High"
         elif days_left > 3: risk = "Medium"
-        
+
         return {
             "style_no": style_no,
             "estimated_days": round(days_left, 1),
@@ -133,40 +176,84 @@ class PredictEngine:
             "avg_efficiency": round(eff_trend * 100, 1)
         }
 
+    def predict_batch(self, style_nos):
+        # One DB fetch + one ONNX call for every style; results keep input order
+        if not self.loaded:
+            return [{"style_no": s, "error": "Model not loaded"} for s in style_nos]
+
+        snapshots = self.get_latest_data_batch(style_nos)
+        return self.score_snapshots(style_nos, snapshots)
+
+    async def predict_batch_async(self, style_nos):
+        # Async DB fetch, then features + ONNX inference off the event loop
+        if not self.loaded:
+            return [{"style_no": s, "error": "Model not loaded"} for s in style_nos]
+
+        snapshots = await self.get_latest_data_batch_async(style_nos)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.score_snapshots, style_nos, snapshots)
+
+    def score_snapshots(self, style_nos, snapshots):
+        found = list(dict.fromkeys(s for s in style_nos if s.lower() in snapshots))
+
+        predictions = {}
+        if found:
+            rows = [snapshots[s.lower()][0] for s in found]
+            totals = [snapshots[s.lower()][1] for s in found]
+            trends = [snapshots[s.lower()][2] for s in found]
+            features, remaining, eff_trend = build_feature_matrix(rows, totals, trends, self.encoders)
+            rates = self.run_model(features)
+            for i, style_no in enumerate(found):
+                predictions[style_no] = self.format_prediction(
+                    style_no, float(remaining[i]), float(rates[i]), float(eff_trend[i])
+                )
+
+        results = []
+        for style_no in style_nos:
+            if style_no in predictions:
+                results.append(predictions[style_no])
+            else:
+                results.append({"style_no": style_no, "error": f"Style {style_no} not found in history."})
+        return results
+
+    def predict_order(self, style_no):
+        if not self.loaded:
+            return {"error": "Model not loaded"}
+        return self.predict_batch([style_no])[0]
+
+    async def predict_order_async(self, style_no):
+        if not self.loaded:
+            return {"error": "Model not loaded"}
+        if self.batcher:
+            return await self.batcher.submit(style_no)
+        return (await self.predict_batch_async([style_no]))[0]
+
     def get_active_risk_report(self):
         if not self.loaded:
             return {"error": "Model not loaded"}
-            
+
         try:
-            conn = mysql.connector.connect(**self.db_config)
-            # Find Active Styles (Most recent entry has remaining qty implied, or just check limit)
-            # Better: Get distinct styles from recent 1000 entries and check prediction
-            query = "SELECT style_no FROM production_data ORDER BY production_date DESC LIMIT 1000"
-            query = "SELECT style_no FROM production_data ORDER BY production_date DESC LIMIT 1000"
-            cursor = conn.cursor()
-            cursor.execute(query)
-            rows = cursor.fetchall()
-            conn.close()
-            
-            # Deduplicate
-            styles = []
-            seen = set()
-            for r in rows:
-                if r[0] not in seen:
-                    styles.append(r[0])
-                    seen.add(r[0])
-            
-            unique_styles = styles[:5]
-            
+            conn = self.get_db_connection()
+            try:
+                # Find Active Styles: distinct styles among the most recent entries
+                query = "SELECT style_no FROM production_data ORDER BY production_date DESC LIMIT %s"
+                cursor = conn.cursor()
+                cursor.execute(query, (self.active_window,))
+                rows = cursor.fetchall()
+            finally:
+                conn.close()
+
+            # Deduplicate preserving recency order
+            unique_styles = list(dict.fromkeys(r[0] for r in rows if r[0]))
+
+            # Single batched prediction for every active style
             report = []
-            for style in unique_styles:
-                # start = pd.Timestamp.now() # Unused
-                pred = self.predict_order(style)
+            for pred in self.predict_batch(unique_styles):
                 # Only include valid, incomplete orders
                 if "error" not in pred and pred['remaining_qty'] > 0:
                     report.append(pred)
-            
+
             return {"styles": report}
-            
+
         except Exception as e:
             return {"error": str(e)}
@@ -0,0 +1,151 @@
+import copy
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Response cache for /ask, keyed on the (sql, params) QueryInterpreter produces.
+# Entries are evicted LRU-first when over the entry/byte limits, expire after a
+# TTL, and the whole cache is dropped when production_data changes (new MAX(id)
+# or MAX(production_date)). Each entry carries the data version it was computed
+# against: a response computed before an invalidation is never stored after it.
+
+CACHE_ENABLED = os.getenv('QUERY_CACHE_ENABLED', '1') == '1'
+CACHE_MAX_ENTRIES = int(os.getenv('QUERY_CACHE_MAX_ENTRIES', 1000))
+CACHE_MAX_BYTES = int(os.getenv('QUERY_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+CACHE_TTL = float(os.getenv('QUERY_CACHE_TTL', 300))
+# How often (seconds) to poll the data version; bounds how stale a hit can be
+CACHE_VERSION_CHECK = float(os.getenv('QUERY_CACHE_VERSION_CHECK', 5))
+
+
+class QueryCache:
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES,
+                 ttl=CACHE_TTL, version_check_interval=CACHE_VERSION_CHECK, enabled=CACHE_ENABLED):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.version_check_interval = version_check_interval
+        self.enabled = enabled
+
+        self._entries = OrderedDict()  # key -> (value, size_bytes, expires_at, version)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self._version = None
+        self._version_checked_at = 0.0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.stale_puts = 0
+
+    @staticmethod
+    def make_key(sql, params):
+        # Normalize whitespace so formatting differences share an entry
+        normalized = ' '.join(sql.split())
+        return (normalized, tuple(params or ()))
+
+    @property
+    def version(self):
+        # Pass to put() to tie a response to the data it was computed from
+        return self._version
+
+    def claim_version_check(self):
+        # True at most once per version_check_interval: the caller that gets it polls
+        # the data version; the timestamp moves now, so concurrent callers skip the poll
+        now = time.time()
+        if now - self._version_checked_at < self.version_check_interval:
+            return False
+        self._version_checked_at = now
+        return True
+
+    def update_version(self, version):
+        # Drop everything when the data version moves
+        with self._lock:
+            if self._version is not None and version != self._version:
+                self._clear()
+                self.invalidations += 1
+            self._version = version
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, size, expires_at, version = entry
+            if version != self._version:
+                self._remove(key)
+                self.misses += 1
+                return None
+            if expires_at < time.time():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        # Callers get their own copy; the cached value must not change under other requests
+        return copy.deepcopy(value)
+
+    def put(self, key, value, version):
+        """
+        version: the cache's `version` read before the response was computed.
+        Dropped if the data version has moved since.
+        """
+        if not self.enabled:
+            return
+        size = len(json.dumps(value, default=str))
+        if size > self.max_bytes:
+            return
+        value = copy.deepcopy(value)
+        with self._lock:
+            if version != self._version:
+                self.stale_puts += 1
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, time.time() + self.ttl, version)
+            self._bytes += size
+            # Evict least recently used until within limits
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    def _clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def _remove(self, key):
+        size = self._entries.pop(key)[1]
+        self._bytes -= size
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+                'stale_puts': self.stale_puts,
+                'data_version': list(self._version) if self._version else None
+            }
@@ -1,12 +1,16 @@
 import re
 import os
+import threading
+import time
 from datetime import datetime, timedelta
 import json
-import joblib
-import joblib
+from db_pool import DB_CONFIG, get_pool, fetch_data_version
+from entity_matcher import EntityMatcher
+from intent_scorer import IntentScorer
+import rollup
 
 class QueryInterpreter:
-    def __init__(self):
+    def __init__(self, lazy=False):
         self.metrics = {
             'efficiency': 'AVG(day_achieved / day_target * 100) as efficiency',
             'wastage': 'AVG((actual_fabric_used - planned_fabric_meters) / planned_fabric_meters * 100) as wastage',
@@ -17,23 +21,29 @@ class QueryInterpreter:
         }
         
         # Load NLP Model
+        self.load_timings = {}
+        start = time.perf_counter()
         try:
-            self.nlp_model = joblib.load('nlp_model.pkl')
+            if os.path.exists('nlp_model.npz'):
+                # Exported weights (export_nlp_model.py): NumPy only, no scikit-learn import
+                self.nlp_model = IntentScorer.load('nlp_model.npz')
+            else:
+                import joblib
+                self.nlp_model = joblib.load('nlp_model.pkl')
             self.ml_enabled = True
             print("NLP Model loaded successfully.")
         except Exception as e:
             print(f"Warning: NLP Model not found: {e}")
             self.ml_enabled = False
+        self.load_timings['nlp_model_ms'] = round((time.perf_counter() - start) * 1000, 1)
         
-        self.db_config = {
-            'host': os.getenv('DB_HOST', 'localhost'),
-            'user': os.getenv('DB_USER', 'root'),
-            'password': os.getenv('DB_PASSWORD', ''),
-            'database': os.getenv('DB_NAME', 'garment_db'),
-            'port': int(os.getenv('DB_PORT', 3306))
-        }
+        self.db_config = DB_CONFIG
         
-        # Default filters (Fallback)
+        # Entity index over every style/buyer/fabric/line in the DB
+        self.matcher = EntityMatcher()
+        self.matcher_loaded = False
+        
+        # Default filters (Fallback when the DB has nothing to match)
         self.filters = {
             'buyer_name': r'for (H&M|Zara|Gap|Nike|Adidas|Puma|Uniqlo)',
             'style_no': r'style (ST\d+)',
@@ -41,23 +51,84 @@ class QueryInterpreter:
             'fabric_type': r'fabric (Single Jersey|Fleece|Rib|Interlock|Pique)'
         }
         
-        # Try to load dynamic filters from DB
-        self.load_dynamic_filters()
+        self._refresh_thread = None
+        self._refresh_stop = threading.Event()
+        self.data_version = None
+        self.anchor_date = None
+        self._loaded = False
+        self._load_lock = threading.Lock()
+        
+        # Answer eligible metrics from the daily rollup (rollup.py) once it is verified complete
+        self.rollup_enabled = os.getenv('ROLLUP_ENABLED', '1') == '1'
+        self.use_rollup = False
         
-        # Load Anchor Date (Max Date in DB)
-        self.anchor_date = self.fetch_max_date()
+        # Lazy mode defers the DB-backed dictionaries until the first query
+        if not lazy:
+            self.ensure_loaded()
+
+    def ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._load_lock:
+            if self._loaded:
+                return
+            start = time.perf_counter()
+            
+            # Change marker (MAX(id), MAX(production_date)) the dictionaries were built from.
+            # Read before loading so rows ingested meanwhile are picked up by the next refresh
+            self.data_version = self.fetch_data_version()
+            
+            # Try to load dynamic filters from DB
+            self.load_dynamic_filters()
+            
+            # Load Anchor Date (Max Date in DB)
+            self.anchor_date = self.fetch_max_date()
+            
+            self.use_rollup = self.check_rollup()
+            
+            self.load_timings['db_dictionaries_ms'] = round((time.perf_counter() - start) * 1000, 1)
+            self._loaded = True
 
     def get_db_connection(self):
-        import mysql.connector
-        return mysql.connector.connect(**self.db_config)
+        # Shared pool (see db_pool.py); close() returns the connection
+        return get_pool(self.db_config).get_connection()
+
+    def fetch_data_version(self):
+        try:
+            conn = self.get_db_connection()
+            try:
+                return fetch_data_version(conn)
+            finally:
+                conn.close()
+        except Exception as e:
+            print(f"Warning: Could not read data version: {e}")
+            return None
+
+    def check_rollup(self):
+        if not self.rollup_enabled:
+            return False
+        try:
+            conn = self.get_db_connection()
+            try:
+                ready = rollup.is_consistent(conn)
+            finally:
+                conn.close()
+        except Exception as e:
+            print(f"Warning: Rollup unavailable, using production_data: {e}")
+            return False
+        if not ready:
+            print("Warning: Rollup out of sync with production_data; run `python rollup.py --rebuild`.")
+        return ready
 
     def fetch_max_date(self):
         try:
             conn = self.get_db_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT MAX(production_date) FROM production_data")
-            max_date = cursor.fetchone()[0]
-            conn.close()
+            try:
+                cursor = conn.cursor()
+                cursor.execute("SELECT MAX(production_date) FROM production_data")
+                max_date = cursor.fetchone()[0]
+            finally:
+                conn.close()
             if max_date:
                 print(f"Anchor Date set to: {max_date}")
                 return max_date
@@ -69,41 +140,118 @@ class QueryInterpreter:
     def load_dynamic_filters(self):
         try:
             conn = self.get_db_connection()
-            cursor = conn.cursor()
+            try:
+                cursor = conn.cursor()
+                matcher = EntityMatcher()
             
-            # Fetch Buyers
-            cursor.execute("SELECT DISTINCT buyer_name FROM production_data")
-            buyers = [row[0] for row in cursor.fetchall() if row[0]]
-            if buyers:
-                # Escape generic regex characters just in case, and join with OR
-                buyer_pattern = '|'.join([re.escape(b) for b in buyers])
+                # Fetch Buyers
+                cursor.execute("SELECT DISTINCT buyer_name FROM production_data")
+                buyers = [row[0] for row in cursor.fetchall() if row[0]]
                 # Allow query to be "for Adidas" or just "Adidas"
-                # using \b to ensure whole word match
-                self.filters['buyer_name'] = f'(?:for\s+)?({buyer_pattern})'
+                matcher.add_many('buyer_name', buyers)
             
-            # Fetch Fabrics
-            cursor.execute("SELECT DISTINCT fabric_type FROM production_data")
-            fabrics = [row[0] for row in cursor.fetchall() if row[0]]
-            if fabrics:
-                fabric_pattern = '|'.join([re.escape(f) for f in fabrics])
-                self.filters['fabric_type'] = f'(?:fabric\s+)?({fabric_pattern})'
+                # Fetch Fabrics
+                cursor.execute("SELECT DISTINCT fabric_type FROM production_data")
+                fabrics = [row[0] for row in cursor.fetchall() if row[0]]
+                matcher.add_many('fabric_type', fabrics)
 
-            # Fetch Styles (Limit to 500 recently used to keep regex manageable)
-            # Fetch Styles (Optimize: Fetch recent rows using index and deduplicate in Python)
-            # Fetching 2000 latest rows is fast with index on production_date
-            cursor.execute("SELECT style_no FROM production_data ORDER BY production_date DESC LIMIT 2000")
-            raw_styles = [row[0] for row in cursor.fetchall() if row[0]]
-            # Deduplicate preserving order
-            styles = list(dict.fromkeys(raw_styles))[:500]
-            if styles:
-                style_pattern = '|'.join([re.escape(s) for s in styles])
-                self.filters['style_no'] = f'(?:style\s+|order\s+|for\s+)?({style_pattern})'
-                
-            conn.close()
-            print(f"Loaded {len(buyers)} buyers, {len(fabrics)} fabrics, {len(styles)} styles from DB.")
+                # Fetch every Style (DISTINCT is a loose scan of idx_style_date; the trie
+                # has no size limit, unlike the old regex alternation)
+                cursor.execute("SELECT DISTINCT style_no FROM production_data")
+                styles = [row[0] for row in cursor.fetchall() if row[0]]
+                matcher.add_many('style_no', styles)
+            
+                # Fetch Lines (matched as "line 5")
+                cursor.execute("SELECT DISTINCT line_no FROM production_data")
+                lines = [int(row[0]) for row in cursor.fetchall() if row[0] is not None]
+                matcher.add_many('line_no', lines, phrase_format='line {}')
+            finally:
+                conn.close()
+            self.matcher = matcher
+            self.matcher_loaded = True
+            print(f"Loaded {len(buyers)} buyers, {len(fabrics)} fabrics, {len(styles)} styles, {len(lines)} lines from DB.")
         except Exception as e:
             print(f"Warning: Could not load dynamic filters: {e}")
 
+    def refresh(self):
+        # Rebuild entity dictionaries + anchor date if production_data changed.
+        # Everything is built on the side and swapped in with plain attribute
+        # assignments, so interpret() never waits on this.
+        if not self._loaded:
+            # Lazy startup: warm the dictionaries off the request path
+            self.ensure_loaded()
+            return True
+        
+        version = self.fetch_data_version()
+        if version is None or version == self.data_version:
+            return False
+
+        new_max_id, new_max_date = version
+        old_max_id = self.data_version[0] if self.data_version else None
+
+        if old_max_id and new_max_id and new_max_id > old_max_id:
+            # Incremental: only entities from rows appended since the last version
+            try:
+                conn = self.get_db_connection()
+                try:
+                    cursor = conn.cursor()
+                    cursor.execute(
+                        "SELECT DISTINCT buyer_name, fabric_type, style_no, line_no FROM production_data WHERE id > %s",
+                        (old_max_id,)
+                    )
+                    rows = cursor.fetchall()
+                finally:
+                    conn.close()
+            except Exception as e:
+                print(f"Warning: Interpreter refresh failed: {e}")
+                return False
+
+            matcher = self.matcher.copy()
+            added = 0
+            for buyer, fabric, style, line in rows:
+                if buyer: added += matcher.add('buyer_name', buyer)
+                if fabric: added += matcher.add('fabric_type', fabric)
+                if style: added += matcher.add('style_no', style)
+                if line is not None: added += matcher.add('line_no', int(line), f'line {int(line)}')
+            self.matcher = matcher
+            if added:
+                print(f"Interpreter refresh: {added} new entities.")
+        else:
+            # Rows removed or first successful load -> full rebuild
+            self.load_dynamic_filters()
+
+        if new_max_date:
+            self.anchor_date = datetime.strptime(new_max_date[:10], '%Y-%m-%d').date()
+        # Writes that bypassed the ingest hooks leave the rollup behind
+        self.use_rollup = self.check_rollup()
+        self.data_version = version
+        return True
+
+    def start_background_refresh(self, interval=None):
+        # Poll the change markers every `interval` seconds on a daemon thread
+        if interval is None:
+            interval = float(os.getenv('INTERPRETER_REFRESH_SECONDS', 60))
+        if self._refresh_thread is not None or (interval <= 0 and self._loaded):
+            return
+
+        def run():
+            # Lazy startup: warm the dictionaries right away, not after the first interval
+            wait = interval if self._loaded else 0
+            while not self._refresh_stop.wait(wait):
+                wait = interval
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"Warning: Interpreter refresh failed: {e}")
+                if interval <= 0:
+                    return
+
+        self._refresh_thread = threading.Thread(target=run, name="interpreter-refresh", daemon=True)
+        self._refresh_thread.start()
+
+    def stop_background_refresh(self):
+        self._refresh_stop.set()
+
     def parse_date_range(self, query):
         # Use anchor_date as 'today' if available, else system date
         today = self.anchor_date if hasattr(self, 'anchor_date') and self.anchor_date else datetime.now().date()
@@ -145,8 +293,13 @@ class QueryInterpreter:
         return date_range
 
     def extract_filters(self, query):
-        extracted_filters = {}
+        # 1. Known entities from the DB (single pass over the query tokens)
+        extracted_filters = self.matcher.find(query)
+        
+        # 2. Regex fallback for anything not in the index (e.g. "line 25")
         for key, pattern in self.filters.items():
+            if key in extracted_filters:
+                continue
             match = re.search(pattern, query, re.IGNORECASE)
             if match:
                 value = match.group(1)
@@ -182,6 +335,7 @@ class QueryInterpreter:
         return "production"
 
     def interpret(self, query):
+        self.ensure_loaded()
         query = query.lower()
         
         # 1. Identify Intent/Metric via ML
@@ -222,7 +376,8 @@ class QueryInterpreter:
                 }
 
         # Standard SQL Query
-        select_clause = self.metrics.get(metric_key, self.metrics['production'])
+        if metric_key not in self.metrics:
+            metric_key = 'production'
         
         # 2. Identify Filters (already done)
         
@@ -230,29 +385,41 @@ class QueryInterpreter:
         date_range = self.parse_date_range(query)
         
         # 4. Construct SQL
-        if date_range:
-            sql = f"SELECT {select_clause} FROM production_data WHERE production_date BETWEEN %s AND %s"
-            params = [date_range['start'], date_range['end']]
-        else:
-            # No date -> All Time (No WHERE Clause for date)
-            sql = f"SELECT {select_clause} FROM production_data WHERE 1=1"
-            params = []
-        
-        for key, value in filters.items():
-            sql += f" AND {key} = %s"
-            params.append(value)
+        use_rollup = self.use_rollup and rollup.is_eligible(metric_key, filters)
+        sql, params = self.build_sql(metric_key, filters, date_range, use_rollup)
             
         return {
             "type": "sql",
             "parsed_query": {
                 "metric": metric_key,
                 "filters": filters,
-                "date_range": date_range if date_range else "All Time"
+                "date_range": date_range if date_range else "All Time",
+                "source": rollup.ROLLUP_TABLE if use_rollup else "production_data"
             },
             "sql": sql,
             "params": params
         }
 
+    def build_sql(self, metric_key, filters, date_range, use_rollup=False):
+        # Same WHERE clause for both sources: the rollup keeps the filter columns' names
+        if use_rollup:
+            select_clause, table = rollup.METRICS[metric_key], rollup.ROLLUP_TABLE
+        else:
+            select_clause, table = self.metrics[metric_key], 'production_data'
+        
+        if date_range:
+            sql = f"SELECT {select_clause} FROM {table} WHERE production_date BETWEEN %s AND %s"
+            params = [date_range['start'], date_range['end']]
+        else:
+            # No date -> All Time (No WHERE Clause for date)
+            sql = f"SELECT {select_clause} FROM {table} WHERE 1=1"
+            params = []
+        
+        for key, value in filters.items():
+            sql += f" AND {key} = %s"
+            params.append(value)
+        return sql, params
+
 if __name__ == "__main__":
     nlp = QueryInterpreter()
     q = "Show fabric wastage report for Single Jersey last week"
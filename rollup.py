@@ -0,0 +1,192 @@
+import sys
+import time
+
+from db_pool import DB_CONFIG
+
+# Daily pre-aggregates of production_data per (date, buyer, style, line, fabric).
+# Averages are stored as sum + count so any combination of groups recombines
+# to exactly the AVG() QueryInterpreter would compute on the raw table.
+#
+# NULL dimension values are stored as sentinels (NOT NULL columns keep the
+# primary key usable); no query the interpreter emits can filter on them.
+
+ROLLUP_TABLE = 'production_daily_rollup'
+
+# Dimensions QueryInterpreter can filter on, with the sentinel used for NULL
+DIMENSIONS = {
+    'production_date': "'1000-01-01'",
+    'buyer_name': "''",
+    'style_no': "''",
+    'line_no': '-1',
+    'fabric_type': "''"
+}
+
+# Measure column -> aggregate over production_data
+# (CASE guards mirror the NULL a division by zero yields in a plain SELECT,
+#  which INSERT ... SELECT would otherwise reject in strict mode)
+MEASURES = {
+    'row_count': 'COUNT(*)',
+    'sum_achieved': 'SUM(day_achieved)',
+    'sum_target_gap': 'SUM(day_target - day_achieved)',
+    'sum_rejection': 'SUM(rejection)',
+    'efficiency_sum': 'SUM(CASE WHEN day_target <> 0 THEN day_achieved / day_target * 100 END)',
+    'efficiency_count': 'COUNT(CASE WHEN day_target <> 0 THEN day_achieved / day_target * 100 END)',
+    'wastage_sum': 'SUM(CASE WHEN planned_fabric_meters <> 0 THEN (actual_fabric_used - planned_fabric_meters) / planned_fabric_meters * 100 END)',
+    'wastage_count': 'COUNT(CASE WHEN planned_fabric_meters <> 0 THEN (actual_fabric_used - planned_fabric_meters) / planned_fabric_meters * 100 END)'
+}
+
+# QueryInterpreter metric -> SELECT clause over the rollup (same aliases as the raw metrics)
+METRICS = {
+    'efficiency': 'SUM(efficiency_sum) / SUM(efficiency_count) as efficiency',
+    'wastage': 'SUM(wastage_sum) / SUM(wastage_count) as wastage',
+    'performance': 'SUM(sum_achieved) as total_production',
+    'target gap': 'SUM(sum_target_gap) as target_gap',
+    'rejection': 'SUM(sum_rejection) as total_rejection',
+    'production': 'SUM(sum_achieved) as total_production'
+}
+
+# Secondary indexes: one per filterable dimension, then the date range
+# (the primary key already leads with production_date)
+INDEXES = {
+    'idx_rollup_buyer_date': '(buyer_name, production_date)',
+    'idx_rollup_style_date': '(style_no, production_date)',
+    'idx_rollup_line_date': '(line_no, production_date)',
+    'idx_rollup_fabric_date': '(fabric_type, production_date)'
+}
+
+CREATE_TABLE = f"""
+CREATE TABLE IF NOT EXISTS {ROLLUP_TABLE} (
+    production_date DATE NOT NULL,
+    buyer_name VARCHAR(100) NOT NULL DEFAULT '',
+    style_no VARCHAR(50) NOT NULL DEFAULT '',
+    line_no INT NOT NULL DEFAULT -1,
+    fabric_type VARCHAR(50) NOT NULL DEFAULT '',
+    row_count INT NOT NULL,
+    sum_achieved BIGINT,
+    sum_target_gap BIGINT,
+    sum_rejection BIGINT,
+    efficiency_sum DECIMAL(30,4),
+    efficiency_count INT NOT NULL,
+    wastage_sum DECIMAL(30,6),
+    wastage_count INT NOT NULL,
+    PRIMARY KEY (production_date, buyer_name, style_no, line_no, fabric_type),
+    {', '.join(f"INDEX {name} {columns}" for name, columns in INDEXES.items())}
+)
+"""
+
+
+def _aggregate_select(where):
+    dims = ', '.join(f"COALESCE({col}, {sentinel})" for col, sentinel in DIMENSIONS.items())
+    measures = ', '.join(MEASURES.values())
+    return f"SELECT {dims}, {measures} FROM production_data WHERE {where} GROUP BY 1, 2, 3, 4, 5"
+
+
+def _insert_prefix():
+    columns = ', '.join(list(DIMENSIONS) + list(MEASURES))
+    return f"INSERT INTO {ROLLUP_TABLE} ({columns}) "
+
+
+def _additive_update():
+    # Fold new aggregates into existing groups; SUM(NULL...) stays NULL only if both sides are
+    parts = []
+    for col in MEASURES:
+        if col in ('row_count', 'efficiency_count', 'wastage_count'):
+            parts.append(f"{col} = {col} + VALUES({col})")
+        else:
+            parts.append(
+                f"{col} = CASE WHEN {col} IS NULL THEN VALUES({col}) "
+                f"WHEN VALUES({col}) IS NULL THEN {col} ELSE {col} + VALUES({col}) END"
+            )
+    return " ON DUPLICATE KEY UPDATE " + ', '.join(parts)
+
+
+def apply_ids(conn, ids):
+    # Incremental refresh for freshly inserted rows.
+    # Runs on the caller's connection without committing.
+    ids = sorted(ids)
+    cursor = conn.cursor()
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        placeholders = ', '.join(['%s'] * len(chunk))
+        cursor.execute(
+            _insert_prefix() + _aggregate_select(f"id IN ({placeholders})") + _additive_update(),
+            chunk
+        )
+
+
+def refresh_keys(conn, keys):
+    """
+    Exact recompute after existing rows were updated in place.
+    keys: (style_no, line_no, production_date) of the updated rows. An update
+    can move a row to another buyer / fabric group, but never to another
+    style, line or day, so every group sharing those three dimensions is
+    rebuilt and nothing else (other styles' groups stay untouched).
+    """
+    keys = sorted({(str(s), int(l), str(d)[:10]) for s, l, d in keys if s and l is not None and d})
+    cursor = conn.cursor()
+    for i in range(0, len(keys), 500):
+        chunk = keys[i:i + 500]
+        params = [v for key in chunk for v in key]
+        placeholders = ', '.join(['(%s, %s, %s)'] * len(chunk))
+        cursor.execute(
+            f"DELETE FROM {ROLLUP_TABLE} WHERE (style_no, line_no, production_date) IN ({placeholders})",
+            params
+        )
+        cursor.execute(
+            _insert_prefix() + _aggregate_select(f"(style_no, line_no, production_date) IN ({placeholders})"),
+            params
+        )
+
+
+def ensure_indexes(conn):
+    # Tables created before an index was added to INDEXES get it here
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT DISTINCT index_name FROM information_schema.statistics "
+        "WHERE table_schema = DATABASE() AND table_name = %s",
+        (ROLLUP_TABLE,)
+    )
+    existing = {r[0] for r in cursor.fetchall()}
+    missing = [f"ADD INDEX {name} {columns}" for name, columns in INDEXES.items() if name not in existing]
+    if missing:
+        cursor.execute(f"ALTER TABLE {ROLLUP_TABLE} {', '.join(missing)}")
+        print(f"Added {len(missing)} index(es) to {ROLLUP_TABLE}")
+
+
+def rebuild(conn):
+    start = time.time()
+    cursor = conn.cursor()
+    cursor.execute(CREATE_TABLE)
+    ensure_indexes(conn)
+    cursor.execute(f"DELETE FROM {ROLLUP_TABLE}")
+    cursor.execute(_insert_prefix() + _aggregate_select("1=1"))
+    conn.commit()
+    cursor.execute(f"SELECT COUNT(*) FROM {ROLLUP_TABLE}")
+    groups = cursor.fetchone()[0]
+    print(f"Rebuilt {ROLLUP_TABLE}: {groups} groups in {time.time() - start:.1f}s")
+    return groups
+
+
+def is_consistent(conn):
+    # The rollup is only safe to query if it covers every base row
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT COALESCE(SUM(row_count), 0) FROM {ROLLUP_TABLE}")
+    rolled_up = int(cursor.fetchone()[0])
+    cursor.execute("SELECT COUNT(*) FROM production_data")
+    base = int(cursor.fetchone()[0])
+    return rolled_up == base and base > 0
+
+
+def is_eligible(metric_key, filters):
+    return metric_key in METRICS and all(key in DIMENSIONS for key in filters)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] != '--rebuild':
+        print("Usage: python rollup.py [--rebuild]")
+        sys.exit(1)
+
+    import mysql.connector
+    conn = mysql.connector.connect(**DB_CONFIG)
+    rebuild(conn)
+    conn.close()
@@ -3,7 +3,7 @@
 
 CREATE TABLE IF NOT EXISTS production_data (
     id INT AUTO_INCREMENT PRIMARY KEY,
-    order_no VARCHAR(50),
+    order_no VARCHAR(50) NOT NULL DEFAULT '',
     buyer_name VARCHAR(100),
     style_no VARCHAR(50),
     order_quantity INT,
@@ -31,8 +31,46 @@ CREATE TABLE IF NOT EXISTS production_data (
     line_no INT
 );
 
--- Indexes for optimization
-CREATE INDEX idx_date ON production_data(production_date);
-CREATE INDEX idx_buyer ON production_data(buyer_name);
-CREATE INDEX idx_line ON production_data(line_no);
-CREATE INDEX idx_style ON production_data(style_no);
+-- Indexes for optimization (one per QueryInterpreter filter, followed by the date range;
+-- see migrations/001_composite_indexes.sql)
+CREATE INDEX idx_buyer_date ON production_data(buyer_name, production_date);
+CREATE INDEX idx_style_date ON production_data(style_no, production_date);
+CREATE INDEX idx_line_date ON production_data(line_no, production_date);
+CREATE INDEX idx_fabric_date ON production_data(fabric_type, production_date);
+-- Natural key: re-ingesting an export updates rows instead of duplicating them
+CREATE UNIQUE INDEX uq_natural_key ON production_data(style_no, line_no, production_date, order_no);
+-- Covering index for date-only aggregates
+CREATE INDEX idx_date_measures ON production_data(production_date, day_achieved, day_target, rejection, planned_fabric_meters, actual_fabric_used);
+-- Per-style running totals maintained on ingest (see style_progress.py)
+CREATE TABLE IF NOT EXISTS style_progress (
+    style_no VARCHAR(50) PRIMARY KEY,
+    cumulative_achieved BIGINT NOT NULL DEFAULT 0,
+    latest_id INT,
+    latest_date DATE,
+    recent_efficiency VARCHAR(1024),
+    efficiency_7d DOUBLE,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+-- Daily aggregates per (date, buyer, style, line, fabric) maintained on ingest (see rollup.py).
+-- NULL dimensions are stored as '' / -1 / '1000-01-01'; averages as sum + count.
+CREATE TABLE IF NOT EXISTS production_daily_rollup (
+    production_date DATE NOT NULL,
+    buyer_name VARCHAR(100) NOT NULL DEFAULT '',
+    style_no VARCHAR(50) NOT NULL DEFAULT '',
+    line_no INT NOT NULL DEFAULT -1,
+    fabric_type VARCHAR(50) NOT NULL DEFAULT '',
+    row_count INT NOT NULL,
+    sum_achieved BIGINT,
+    sum_target_gap BIGINT,
+    sum_rejection BIGINT,
+    efficiency_sum DECIMAL(30,4),
+    efficiency_count INT NOT NULL,
+    wastage_sum DECIMAL(30,6),
+    wastage_count INT NOT NULL,
+    PRIMARY KEY (production_date, buyer_name, style_no, line_no, fabric_type),
+    INDEX idx_rollup_buyer_date (buyer_name, production_date),
+    INDEX idx_rollup_style_date (style_no, production_date),
+    INDEX idx_rollup_line_date (line_no, production_date),
+    INDEX idx_rollup_fabric_date (fabric_type, production_date)
+);
@@ -0,0 +1,191 @@
+import json
+import sys
+import time
+
+from db_pool import DB_CONFIG
+
+# Per-style running totals so predictions don't re-scan a style's history.
+# style_progress keeps, for each style:
+#   - cumulative_achieved: SUM(day_achieved) over all rows
+#   - latest_id / latest_date: the newest snapshot (by production_date, then id)
+#   - recent_efficiency: the last WINDOW snapshots as [date, id, efficiency]
+#   - efficiency_7d: their mean (same 7-row window train_model.py uses)
+
+WINDOW = 7
+
+SELECT_COLUMNS = "style_no, cumulative_achieved, latest_id, latest_date, recent_efficiency, efficiency_7d"
+
+UPSERT_QUERY = """
+INSERT INTO style_progress (
+    style_no, cumulative_achieved, latest_id, latest_date, recent_efficiency, efficiency_7d
+) VALUES (%s, %s, %s, %s, %s, %s)
+ON DUPLICATE KEY UPDATE
+    cumulative_achieved = VALUES(cumulative_achieved),
+    latest_id = VALUES(latest_id),
+    latest_date = VALUES(latest_date),
+    recent_efficiency = VALUES(recent_efficiency),
+    efficiency_7d = VALUES(efficiency_7d)
+"""
+
+
+def snapshot_efficiency(day_achieved, day_target):
+    # Same as train_model.py: achieved / target, 0 when target is missing
+    if not day_target:
+        return 0.0
+    return float(day_achieved or 0) / float(day_target)
+
+
+def _merge_window(window, snapshots):
+    # window/snapshots: lists of [date_str, id, efficiency]; keep the newest WINDOW
+    merged = sorted(window + snapshots, key=lambda s: (s[0], s[1]))
+    return merged[-WINDOW:]
+
+
+def _progress_row(style_no, cumulative, window):
+    latest = window[-1]
+    efficiency_7d = sum(s[2] for s in window) / len(window)
+    return (style_no, int(cumulative), latest[1], latest[0], json.dumps(window), efficiency_7d)
+
+
+def apply_rows(conn, rows):
+    """
+    Incrementally fold newly inserted production rows into style_progress.
+    rows: dicts with id, style_no, production_date, day_achieved, day_target.
+    Runs on the caller's connection without committing, so the update lands
+    in the same transaction as the INSERT batch.
+    """
+    # Group the batch by style (MySQL compares style_no case-insensitively)
+    batch = {}
+    for r in rows:
+        if not r.get('style_no') or r.get('production_date') is None:
+            continue
+        key = str(r['style_no']).lower()
+        entry = batch.setdefault(key, {'style_no': r['style_no'], 'achieved': 0, 'snapshots': []})
+        entry['achieved'] += int(r.get('day_achieved') or 0)
+        entry['snapshots'].append([
+            str(r['production_date'])[:10],
+            int(r['id']),
+            snapshot_efficiency(r.get('day_achieved'), r.get('day_target'))
+        ])
+    if not batch:
+        return 0
+
+    cursor = conn.cursor()
+
+    # Lock the existing progress rows for these styles
+    existing = {}
+    keys = list(batch.keys())
+    for i in range(0, len(keys), 500):
+        chunk = keys[i:i + 500]
+        placeholders = ', '.join(['%s'] * len(chunk))
+        cursor.execute(
+            f"SELECT {SELECT_COLUMNS} FROM style_progress WHERE style_no IN ({placeholders}) FOR UPDATE",
+            chunk
+        )
+        for row in cursor.fetchall():
+            existing[str(row[0]).lower()] = row
+
+    updates = []
+    for key, entry in batch.items():
+        current = existing.get(key)
+        if current:
+            style_no, cumulative, window = current[0], int(current[1] or 0), json.loads(current[4] or '[]')
+        else:
+            style_no, cumulative, window = entry['style_no'], 0, []
+        window = _merge_window(window, entry['snapshots'])
+        updates.append(_progress_row(style_no, cumulative + entry['achieved'], window))
+
+    cursor.executemany(UPSERT_QUERY, updates)
+    return len(updates)
+
+
+def progress_query(style_nos):
+    placeholders = ', '.join(['%s'] * len(style_nos))
+    return f"SELECT {SELECT_COLUMNS} FROM style_progress WHERE style_no IN ({placeholders})", list(style_nos)
+
+
+def fetch_progress(conn, style_nos):
+    # {style_no.lower(): progress dict} for the given styles
+    cursor = conn.cursor(dictionary=True)
+    progress = {}
+    for i in range(0, len(style_nos), 500):
+        cursor.execute(*progress_query(style_nos[i:i + 500]))
+        for row in cursor.fetchall():
+            progress[row['style_no'].lower()] = row
+    return progress
+
+
+def compute_progress(conn, style_nos=None):
+    # Progress rows recomputed from production_data (all styles, or just style_nos)
+    cursor = conn.cursor()
+    where, params = "style_no IS NOT NULL", []
+    if style_nos is not None:
+        where = f"style_no IN ({', '.join(['%s'] * len(style_nos))})"
+        params = list(style_nos)
+
+    cursor.execute(f"SELECT style_no, SUM(day_achieved) FROM production_data WHERE {where} GROUP BY style_no", params)
+    totals = {r[0]: r[1] or 0 for r in cursor.fetchall()}
+
+    cursor.execute(f"""
+    SELECT style_no, production_date, id, day_achieved, day_target FROM (
+        SELECT style_no, production_date, id, day_achieved, day_target,
+               ROW_NUMBER() OVER (PARTITION BY style_no ORDER BY production_date DESC, id DESC) AS rn
+        FROM production_data
+        WHERE {where} AND production_date IS NOT NULL
+    ) recent
+    WHERE rn <= {WINDOW}
+    """, params)
+    windows = {}
+    for style_no, prod_date, row_id, achieved, target in cursor.fetchall():
+        windows.setdefault(style_no, []).append([str(prod_date), int(row_id), snapshot_efficiency(achieved, target)])
+
+    updates = []
+    for style_no, window in windows.items():
+        window = sorted(window, key=lambda s: (s[0], s[1]))
+        updates.append(_progress_row(style_no, totals.get(style_no, 0), window))
+    return updates
+
+
+def refresh_styles(conn, style_nos):
+    """
+    Recompute progress for specific styles after existing production rows
+    were updated in place (apply_rows only handles appended rows).
+    Runs on the caller's connection without committing.
+    """
+    style_nos = sorted({str(s) for s in style_nos if s})
+    cursor = conn.cursor()
+    count = 0
+    for i in range(0, len(style_nos), 500):
+        updates = compute_progress(conn, style_nos[i:i + 500])
+        if updates:
+            cursor.executemany(UPSERT_QUERY, updates)
+        count += len(updates)
+    return count
+
+
+def rebuild(conn):
+    # Recompute style_progress from production_data (run after bulk imports)
+    start = time.time()
+    cursor = conn.cursor()
+
+    print(f"Computing cumulative totals and last {WINDOW} snapshots per style...")
+    updates = compute_progress(conn)
+
+    cursor.execute("DELETE FROM style_progress")
+    for i in range(0, len(updates), 5000):
+        cursor.executemany(UPSERT_QUERY, updates[i:i + 5000])
+    conn.commit()
+
+    print(f"Rebuilt style_progress for {len(updates)} styles in {time.time() - start:.1f}s")
+    return len(updates)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] != '--rebuild':
+        print("Usage: python style_progress.py [--rebuild]")
+        sys.exit(1)
+
+    import mysql.connector
+    conn = mysql.connector.connect(**DB_CONFIG)
+    rebuild(conn)
+    conn.close()
@@ -1,100 +1,231 @@
+import math
+
+
+def _add_partial(partials, x):
+    # Shewchuk's exact float summation (the recipe behind math.fsum): partials
+    # hold the running sum without rounding error, so the total doesn't
+    # depend on how rows were split across chunks or the order of merges
+    i = 0
+    for y in partials:
+        if abs(x) < abs(y):
+            x, y = y, x
+        hi = x + y
+        lo = y - (hi - x)
+        if lo:
+            partials[i] = lo
+            i += 1
+        x = hi
+    partials[i:] = [x]
+
+
+class Stats:
+    """
+    Mergeable count/sum/min/max accumulator. int and Decimal values (what
+    MySQL returns) are summed exactly as-is, floats via exact partials.
+    """
+    __slots__ = ('count', 'exact', 'partials', 'min', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.exact = 0
+        self.partials = []
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.count += 1
+        if isinstance(value, float):
+            _add_partial(self.partials, value)
+        else:
+            self.exact += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        self.count += other.count
+        self.exact += other.exact
+        for p in other.partials:
+            _add_partial(self.partials, p)
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+        return self
+
+    @property
+    def sum(self):
+        if not self.partials:
+            return self.exact
+        return math.fsum(self.partials + [float(self.exact)])
+
+    def mean(self):
+        return self.sum / self.count if self.count else None
+
+
+class GroupStats:
+    """Per-key Stats (e.g. efficiency per buyer), merged key by key."""
+    def __init__(self):
+        self.groups = {}
+
+    def add(self, key, value):
+        stats = self.groups.get(key)
+        if stats is None:
+            stats = self.groups[key] = Stats()
+        stats.add(value)
+
+    def merge(self, other):
+        for key, stats in other.groups.items():
+            if key in self.groups:
+                self.groups[key].merge(stats)
+            else:
+                self.groups[key] = Stats().merge(stats)
+        return self
+
+    def best(self):
+        # Key with the highest mean
+        if not self.groups:
+            return None
+        return max(self.groups, key=lambda k: self.groups[k].mean())
+
+
+class SummaryStream:
+    """
+    Incremental version of SummaryEngine.generate_summary: rows are fed one at
+    a time with add() and only running statistics are kept. Streams built over
+    separate chunks of a result combine exactly with merge().
+    """
+    def __init__(self, engine, metric, query_context):
+        self.engine = engine
+        self.metric = metric
+        self.query_context = query_context
+        self.column = {
+            'efficiency': 'efficiency',
+            'wastage': 'wastage',
+            'rejection': 'total_rejection',
+            'production': 'total_production'
+        }.get(metric)
+        self.rows = 0
+        self.values = Stats()
+        self.high_waste = 0
+        self.group_by_buyer = None
+        self.buyers = GroupStats()
+
+    def add(self, row):
+        if self.group_by_buyer is None:
+            # Grouping is decided by the first row's columns
+            self.group_by_buyer = 'buyer_name' in row
+        self.rows += 1
+
+        val = row.get(self.column) if self.column else None
+        if val is None:
+            return
+        self.values.add(val)
+
+        if self.metric == 'efficiency' and self.group_by_buyer:
+            self.buyers.add(row['buyer_name'], val)
+        elif self.metric == 'wastage' and val > 5:
+            self.high_waste += 1
+
+    def merge(self, other):
+        if self.group_by_buyer is None:
+            self.group_by_buyer = other.group_by_buyer
+        self.rows += other.rows
+        self.values.merge(other.values)
+        self.high_waste += other.high_waste
+        self.buyers.merge(other.buyers)
+        return self
+
+    def average(self):
+        return self.values.mean()
+
+    def result(self):
+        if not self.rows:
+            return {"summary": "No data found for the given criteria.", "recommendations": [], "data_points": 0}
+
+        insights = []
+        if self.metric == 'efficiency':
+            if self.values.count:
+                insights.append(f"The average line efficiency was {self.average():.2f}%.")
+                insights.append(f"The best performance was {self.values.max:.2f}% and the lowest was {self.values.min:.2f}%.")
+
+            # Identify high/low performers if grouped
+            best_buyer = self.buyers.best()
+            if best_buyer is not None:
+                insights.append(f"The best performing buyer was {best_buyer}.")
+
+        elif self.metric == 'wastage':
+            if self.values.count:
+                insights.append(f"Average fabric wastage observed is {self.average():.2f}%.")
+            if self.high_waste:
+                insights.append(f"⚠️ Warning: {self.high_waste} instances detected with >5% wastage.")
+
+        elif self.metric == 'rejection':
+            insights.append(f"Total rejected pieces found: {self.values.sum}.")
+
+        elif self.metric == 'production':
+            insights.append(f"Total production quantity is {self.values.sum:,.0f}.")
+
+        # Contextualize with Query Filters
+        if self.query_context and self.query_context.get('filters'):
+            filters = self.query_context['filters']
+            context_parts = []
+            if 'buyer_name' in filters:
+                context_parts.append(f"For Buyer **{filters['buyer_name']}**")
+            if 'fabric_type' in filters:
+                context_parts.append(f"For Fabric **{filters['fabric_type']}**")
+
+            if context_parts:
+                insights.insert(0, ", ".join(context_parts) + ":")
+
+        return {
+            "summary": " ".join(insights),
+            "recommendations": self.engine.recommend(self.metric, self.average()),
+            "data_points": self.rows
+        }
+
 
 class SummaryEngine:
     def __init__(self):
         pass
-    
+
+    def start_summary(self, metric, query_context):
+        # For streamed results: feed rows with .add(row), then call .result()
+        return SummaryStream(self, metric, query_context)
+
+    def summarize(self, rows, metric, query_context):
+        # One pass over rows (any iterable) -> SummaryStream
+        stream = self.start_summary(metric, query_context)
+        for r in rows:
+            stream.add(r)
+        return stream
+
+    def combine(self, streams):
+        # Merge partial summaries (chunks / parallel workers) into one
+        streams = list(streams)
+        combined = self.start_summary(streams[0].metric, streams[0].query_context)
+        for stream in streams:
+            combined.merge(stream)
+        return combined
+
     def generate_summary(self, rows, metric, query_context):
         """
         Generates a natural language summary based on the data and metric.
         """
         if not rows:
             return "No data found for the given criteria."
-            
-        # Helper to get column
-        def get_col(col):
-            return [r[col] for r in rows if r.get(col) is not None]
-
-        insights = []
-        
-        # General Stats
-        total_rows = len(rows)
-        
-        if metric == 'efficiency':
-            vals = get_col('efficiency')
-            if vals:
-                avg_eff = sum(vals) / len(vals)
-                max_eff = max(vals)
-                min_eff = min(vals)
-                insights.append(f"The average line efficiency was {avg_eff:.2f}%.")
-                insights.append(f"The best performance was {max_eff:.2f}% and the lowest was {min_eff:.2f}%.")
-            
-            # Identify high/low performers if grouped
-            if 'buyer_name' in rows[0]:
-                # Simple groupby max
-                sums = {}
-                counts = {}
-                for r in rows:
-                    if r.get('efficiency') is not None:
-                        bn = r['buyer_name']
-                        sums[bn] = sums.get(bn, 0) + r['efficiency']
-                        counts[bn] = counts.get(bn, 0) + 1
-                
-                if sums:
-                    best_buyer = max(sums, key=lambda k: sums[k]/counts[k])
-                    insights.append(f"The best performing buyer was {best_buyer}.")
-                
-        elif metric == 'wastage':
-            vals = get_col('wastage')
-            if vals:
-                avg_wastage = sum(vals) / len(vals)
-                insights.append(f"Average fabric wastage observed is {avg_wastage:.2f}%.")
-            
-            high_waste = [r for r in rows if r.get('wastage', 0) > 5]
-            if high_waste:
-                insights.append(f"⚠️ Warning: {len(high_waste)} instances detected with >5% wastage.")
-                
-        elif metric == 'rejection':
-            vals = get_col('total_rejection')
-            total_rej = sum(vals)
-            insights.append(f"Total rejected pieces found: {total_rej}.")
-        
-        elif metric == 'production':
-             vals = get_col('total_production')
-             total_prod = sum(vals)
-             insights.append(f"Total production quantity is {total_prod:,.0f}.")
-
-        # Recommendations logic
-        recommendations = self.get_recommendations(metric, rows)
-        
-        # Contextualize with Query Filters
-        if query_context and query_context.get('filters'):
-             filters = query_context['filters']
-             context_parts = []
-             if 'buyer_name' in filters:
-                 context_parts.append(f"For Buyer **{filters['buyer_name']}**")
-             if 'fabric_type' in filters:
-                 context_parts.append(f"For Fabric **{filters['fabric_type']}**")
-             
-             if context_parts:
-                 insights.insert(0, ", ".join(context_parts) + ":")
-        
-        summary_text = " ".join(insights)
-        return {
-            "summary": summary_text,
-            "recommendations": recommendations,
-            "data_points": len(rows)
-        }
+        return self.summarize(rows, metric, query_context).result()
 
     def get_recommendations(self, metric, rows):
+        return self.recommend(metric, self.summarize(rows, metric, {}).average())
+
+    def recommend(self, metric, average):
         recs = []
         if metric == 'efficiency':
-            vals = [r['efficiency'] for r in rows if r.get('efficiency') is not None]
-            if vals and (sum(vals) / len(vals)) < 60:
+            if average is not None and average < 60:
                 recs.append("Efficiency is below 60%. Investigate line bottlenecks and operator training.")
         if metric == 'wastage':
-            vals = [r['wastage'] for r in rows if r.get('wastage') is not None]
-            if vals and (sum(vals) / len(vals)) > 2:
+            if average is not None and average > 2:
                 recs.append("Fabric wastage > 2%. Check cutting markers and roll utilization.")
         return recs
-
-
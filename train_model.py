@@ -7,6 +7,10 @@ from sklearn.metrics import r2_score, mean_absolute_error
 import joblib
 import mysql.connector
 import os
+import sys
+import feature_engine
+from feature_engine import NUMERIC_FEATURES
+from feature_store import FeatureStore, SOURCE_COLUMNS
 
 # DB Config
 DB_CONFIG = {
@@ -19,10 +23,8 @@ DB_CONFIG = {
 
 def get_full_data():
     conn = mysql.connector.connect(**DB_CONFIG)
-    # Fetch all data to perform time-series feature engineering
-    query = """
-    SELECT * FROM production_data ORDER BY production_date ASC
-    """
+    # Fetch the columns the time-series features need (feature_engineering sorts them itself)
+    query = f"SELECT {', '.join(SOURCE_COLUMNS)} FROM production_data"
     df = pd.read_sql(query, conn)
     conn.close()
     return df
@@ -30,64 +32,95 @@ def get_full_data():
 def feature_engineering(df):
     print("Engineering features...")
     
-    # Sort for rolling calcs
-    df['production_date'] = pd.to_datetime(df['production_date'])
-    df = df.sort_values(['style_no', 'production_date'])
-    
-    # 1. Cumulative Achieved
-    df['cumulative_achieved'] = df.groupby('style_no')['day_achieved'].cumsum()
-    
-    # 2. Remaining Quantity
-    df['remaining_qty'] = df['order_quantity'] - df['cumulative_achieved']
-    # Filter out completed orders for training realistic "in-progress" scenarios
-    df = df[df['remaining_qty'] > 0]
-    
-    # 3. Efficiency Trend (7-day rolling average)
-    # Calculate daily efficiency first
-    df['daily_efficiency'] = (df['day_achieved'] / df['day_target']).replace([np.inf, -np.inf], 0).fillna(0)
-    df['efficiency_trend'] = df.groupby('style_no')['daily_efficiency'].transform(
-        lambda x: x.rolling(window=7, min_periods=1).mean()
-    )
-    
-    # 4. Fabric Variance
-    df['fabric_variance'] = (df['actual_fabric_used'] - df['planned_fabric_meters']) / df['planned_fabric_meters']
-    df['fabric_variance'] = df['fabric_variance'].replace([np.inf, -np.inf], 0).fillna(0)
-    
-    # 5. Hour Output Sum
-    hour_cols = [f'hour_{i}' for i in range(1, 9)]
-    df['hour_output'] = df[hour_cols].sum(axis=1)
+    # One sort, then per-style cumsum / rolling over contiguous segments (see feature_engine.py)
+    cols = feature_engine.sort_rows(feature_engine.compact_columns(df))
+    result = feature_engine.engineer(cols)
+    keep = result['keep']
+    
+    # Target Variable: predict 'day_achieved' capability (daily rate) based on current state;
+    # days to completion are then inferred as remaining / predicted_rate
+    out = pd.DataFrame(result['features'], columns=NUMERIC_FEATURES)
+    out['style_no'] = pd.Categorical.from_codes(cols['style_code'][keep], cols['styles'])
+    out['buyer_name'] = pd.Categorical.from_codes(cols['buyer_code'][keep], cols['buyers'])
+    out['production_date'] = cols['production_date'][keep]
+    out['day_achieved'] = cols['day_achieved'][keep]
+    return out
 
-    # 6. Target Variable: Days to produce remaining qty based on current rate
-    # We want the model to predict the "Current Capability" (Daily Rate)
-    # Then we infer days = remaining / predicted_rate
-    # So our target is actually the NEXT DAY's achievement (or current day capability)
-    # But for "Order Completion", let's predict the effective daily rate directly.
-    # Actually, simpler: Predict 'day_achieved' capability based on current state.
-    
-    return df
+def load_from_store(rebuild=False):
+    # Features cached by feature_store.py: only rows newer than the watermark are read
+    conn = mysql.connector.connect(**DB_CONFIG)
+    store = FeatureStore()
+    if rebuild:
+        store.rebuild(conn)
+    else:
+        store.update(conn)
+    conn.close()
+    return store.load()
 
-def train_model():
-    df = get_full_data()
-    df = feature_engineering(df)
-    
-    # Encoders
+# Features
+FEATURE_COLUMNS = [
+    'style_encoded', 'buyer_encoded', 'order_quantity', 
+    'cumulative_achieved', 'remaining_qty', 'daily_efficiency', 
+    'efficiency_trend', 'fabric_variance', 'hour_output', 'rejection', 'line_no'
+]
+
+def load_training_data(full_scan=False, rebuild=False):
+    """
+    Returns (X float32 (N, 11) in FEATURE_COLUMNS order, y, production dates, le_style, le_buyer),
+    or None when there are no training rows.
+    """
     le_style = LabelEncoder()
     le_buyer = LabelEncoder()
-    df['style_encoded'] = le_style.fit_transform(df['style_no'])
-    df['buyer_encoded'] = le_buyer.fit_transform(df['buyer_name'])
-    
-    # Features
-    feature_cols = [
-        'style_encoded', 'buyer_encoded', 'order_quantity', 
-        'cumulative_achieved', 'remaining_qty', 'daily_efficiency', 
-        'efficiency_trend', 'fabric_variance', 'hour_output', 'rejection', 'line_no'
-    ]
-    
-    target_col = 'day_achieved' # We predict how much they can make per day
-    
-    X = df[feature_cols].fillna(0)
-    y = df[target_col].fillna(0)
     
+    if full_scan:
+        df = get_full_data()
+        df = feature_engineering(df)
+        
+        # Encoders
+        df['style_encoded'] = le_style.fit_transform(df['style_no'])
+        df['buyer_encoded'] = le_buyer.fit_transform(df['buyer_name'])
+        
+        X = df[FEATURE_COLUMNS].fillna(0).to_numpy(np.float32)
+        y = df['day_achieved'].fillna(0).to_numpy()
+        dates = df['production_date'].to_numpy()
+    else:
+        data = load_from_store(rebuild)
+        if data is None:
+            return None
+        
+        # Encoders
+        columns = {
+            'style_encoded': le_style.fit_transform(data['style_no']),
+            'buyer_encoded': le_buyer.fit_transform(data['buyer_name'])
+        }
+        for i, col in enumerate(NUMERIC_FEATURES):
+            columns[col] = data['features'][:, i]
+        
+        X = np.column_stack([columns[col] for col in FEATURE_COLUMNS]).astype(np.float32)
+        y = data['target']
+        dates = data['production_date']
+    return X, y, dates, le_style, le_buyer
+
+def save_artifacts(model, le_style, le_buyer, path='model_order_completion.pkl'):
+    # Same layout convert_to_onnx.py / export_encoders.py read
+    artifacts = {
+        'model': model,
+        'le_style': le_style,
+        'le_buyer': le_buyer,
+        'features': FEATURE_COLUMNS
+    }
+    joblib.dump(artifacts, path)
+    print(f"Model artifacts saved to '{path}'")
+
+def train_model(full_scan=False, rebuild=False):
+    data = load_training_data(full_scan, rebuild)
+    if data is None:
+        print("No training rows in the feature store.")
+        return
+    X, y, _, le_style, le_buyer = data
+    
+    # We predict how much they can make per day ('day_achieved')
+    print(f"Training rows: {len(X)}")
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
     
     print("Training Random Forest Regressor...")
@@ -103,14 +136,9 @@ def train_model():
     print(f"Mean Absolute Error: {mae:.2f} pcs")
     
     # Save everything
-    artifacts = {
-        'model': model,
-        'le_style': le_style,
-        'le_buyer': le_buyer,
-        'features': feature_cols
-    }
-    joblib.dump(artifacts, 'model_order_completion.pkl')
-    print("Model artifacts saved to 'model_order_completion.pkl'")
+    save_artifacts(model, le_style, le_buyer)
 
 if __name__ == "__main__":
-    train_model()
+    # --rebuild: recompute the whole feature store
+    # --full-scan: original path, engineer features from a full table read
+    train_model(full_scan='--full-scan' in sys.argv, rebuild='--rebuild' in sys.argv)
@@ -81,6 +81,7 @@ def train_nlp_model():
     # Save
     joblib.dump(pipeline, 'nlp_model.pkl')
     print("NLP Model saved to 'nlp_model.pkl'")
+    print("Run `python export_nlp_model.py` to refresh the serving weights (nlp_model.npz).")
 
 if __name__ == "__main__":
     train_nlp_model()
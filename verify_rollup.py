@@ -0,0 +1,67 @@
+import sys
+from datetime import timedelta
+from decimal import Decimal
+
+import mysql.connector
+
+import rollup
+from db_pool import DB_CONFIG
+from query_interpreter import QueryInterpreter
+
+# Runs every rollup-eligible metric against both production_data and
+# production_daily_rollup over a spread of filters/date ranges and reports
+# any result that differs.
+
+def sample_filters(cursor):
+    cursor.execute("SELECT buyer_name, style_no, line_no, fabric_type FROM production_data ORDER BY id DESC LIMIT 1")
+    buyer, style, line, fabric = cursor.fetchone()
+    return [
+        {},
+        {'buyer_name': buyer},
+        {'style_no': style},
+        {'line_no': line},
+        {'fabric_type': fabric},
+        {'buyer_name': buyer, 'fabric_type': fabric},
+        {'buyer_name': 'No Such Buyer'}
+    ]
+
+def date_ranges(cursor):
+    cursor.execute("SELECT MIN(production_date), MAX(production_date) FROM production_data")
+    first, last = cursor.fetchone()
+    ranges = [None, {'start': str(first), 'end': str(last)}]
+    for days in (0, 1, 7, 30, 90):
+        ranges.append({'start': str(last - timedelta(days=days)), 'end': str(last)})
+    return ranges
+
+def same(a, b):
+    if a is None or b is None:
+        return a is None and b is None
+    return abs(Decimal(a) - Decimal(b)) <= Decimal('1e-6') * max(1, abs(Decimal(a)))
+
+if __name__ == "__main__":
+    conn = mysql.connector.connect(**DB_CONFIG)
+    cursor = conn.cursor()
+
+    if not rollup.is_consistent(conn):
+        print("Rollup does not cover production_data; run `python rollup.py --rebuild` first.")
+        sys.exit(1)
+
+    nlp = QueryInterpreter(lazy=True)
+    checked, mismatches = 0, 0
+    for metric in rollup.METRICS:
+        for filters in sample_filters(cursor):
+            for date_range in date_ranges(cursor):
+                results = []
+                for use_rollup in (False, True):
+                    sql, params = nlp.build_sql(metric, filters, date_range, use_rollup)
+                    cursor.execute(sql, params)
+                    results.append(cursor.fetchone()[0])
+                checked += 1
+                if not same(*results):
+                    mismatches += 1
+                    print(f"MISMATCH {metric} {filters} {date_range}: raw={results[0]} rollup={results[1]}")
+
+    conn.close()
+    print(f"Checked {checked} queries: {mismatches} mismatches")
+    if mismatches:
+        sys.exit(1)